@@ -1,6 +1,6 @@
 {
     "name": "Pago Mercantil Steam",
-    "version": "19.0.0.1",
+    "version": "19.0.0.2",
     "category": "Sales",
     "depends": ["base", "sale", "sale_management", "mail", "steamtasabcv"],
     "description": """
@@ -13,6 +13,7 @@
     'data': [
         'views/res_company_views.xml',
         'views/pago_mercantil_views.xml',
+        'data/cron_data.xml',
         'security/ir.model.access.csv'
     ],
     
@@ -0,0 +1,55 @@
+import json
+import zlib
+
+BATCH_SIZE = 1000
+
+
+def _decode_response(response):
+    """The controller stored ``json.dumps(...)`` in the Json column: the value comes back as a JSON string."""
+    if isinstance(response, str):
+        try:
+            return json.loads(response)
+        except ValueError:
+            return response
+    return response
+
+
+def migrate(cr, version):
+    """Move the decrypted notifications stored in webhook_response to the compressed archive."""
+    if not version:
+        return
+    while True:
+        cr.execute("""
+            SELECT id, webhook_response, invoice_number, write_date
+              FROM sale_order_pago_mercantil
+             WHERE webhook_response IS NOT NULL
+               AND webhook_archive_id IS NULL
+          ORDER BY id
+             LIMIT %s
+        """, (BATCH_SIZE,))
+        rows = cr.fetchall()
+        if not rows:
+            break
+        for pago_id, response, invoice_number, received_at in rows:
+            response = _decode_response(response)
+            if isinstance(response, str):
+                payload = response.encode('utf-8')
+            else:
+                payload = json.dumps(response, ensure_ascii=False).encode('utf-8')
+            compressed = zlib.compress(payload, 6)
+            external_id = (response.get('infoMsg') or {}).get('guId') \
+                if isinstance(response, dict) else None
+            cr.execute("""
+                INSERT INTO webhook_payload_archive
+                       (provider, external_id, topic, received_at, payload_zlib,
+                        payload_size, compressed_size,
+                        create_uid, create_date, write_uid, write_date)
+                VALUES ('mercantil', %s, 'payment/confirmation', %s, %s, %s, %s,
+                        1, now() at time zone 'utc', 1, now() at time zone 'utc')
+                RETURNING id
+            """, (external_id or invoice_number, received_at, compressed, len(payload), len(compressed)))
+            cr.execute("""
+                UPDATE sale_order_pago_mercantil
+                   SET webhook_archive_id = %s, webhook_response = NULL
+                 WHERE id = %s
+            """, (cr.fetchone()[0], pago_id))
@@ -1,2 +1,5 @@
 from . import pago_mercantil
-from . import res_company
\ No newline at end of file
+from . import res_company
+from . import exchange_rate
+from . import pago_mercantil_ledger
+from . import webhook_payload_archive
\ No newline at end of file
@@ -0,0 +1,13 @@
+from odoo import api, models
+
+
+class ExchangeRate(models.Model):
+    _inherit = 'steamtasabcv.exchange.rate'
+
+    @api.model
+    def _on_rates_changed(self):
+        super()._on_rates_changed()
+        cron = self.env.ref(
+            'pagomercantilsteam.ir_cron_recompute_amount_ves', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
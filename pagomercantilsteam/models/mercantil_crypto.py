@@ -0,0 +1,69 @@
+import base64
+import json
+import threading
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad, unpad
+
+_local = threading.local()
+
+
+def _get_aes(key_hash):
+    """AES-ECB cipher for a derived key, built once per thread and key."""
+    ciphers = getattr(_local, 'ciphers', None)
+    if ciphers is None:
+        ciphers = _local.ciphers = {}
+    cipher = ciphers.get(key_hash)
+    if cipher is None:
+        if len(ciphers) >= 8:
+            ciphers.clear()
+        cipher = ciphers[key_hash] = AES.new(key_hash, AES.MODE_ECB)
+    return cipher
+
+
+class MercantilCipher:
+    """
+    AES-ECB encryption used by Mercantil for payment links and webhooks.
+
+    The key schedule is built once per thread and key (ECB keeps no state
+    between blocks, so the same cipher serves every payload), and the
+    ``*_many`` methods process whole batches, e.g. for mass link
+    generation or webhook replays.
+
+    Args:
+        key_hash (bytes): 16-byte key derived from the Mercantil secret
+            (see ``sale.order.pago.mercantil._get_aes_key``).
+    """
+
+    def __init__(self, key_hash):
+        self.key_hash = key_hash
+
+    def encrypt(self, data):
+        """Encrypt a dict (serialized to JSON) or a JSON string into Base64 text."""
+        return self.encrypt_many([data])[0]
+
+    def decrypt(self, encrypted_data):
+        """Decrypt Base64 text into the original JSON data."""
+        return self.decrypt_many([encrypted_data])[0]
+
+    def encrypt_many(self, payloads):
+        cipher = _get_aes(self.key_hash)
+        encrypted = []
+        for data in payloads:
+            json_str = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+            encrypted.append(base64.b64encode(
+                cipher.encrypt(pad(json_str.encode('utf-8'), AES.block_size))).decode('utf-8'))
+        return encrypted
+
+    def decrypt_many(self, payloads):
+        """
+        Decrypt a batch of Base64 payloads.
+
+        Raises:
+            ValueError: If a payload is not valid Base64, padding or JSON.
+        """
+        cipher = _get_aes(self.key_hash)
+        return [
+            json.loads(unpad(cipher.decrypt(base64.b64decode(data)), AES.block_size).decode('utf-8'))
+            for data in payloads
+        ]
@@ -1,11 +1,12 @@
-import base64
 import hashlib
 import json
+from datetime import timedelta
 
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad
 from odoo import api, fields, models
 from odoo.exceptions import UserError
+from odoo.tools import ormcache
+
+from .mercantil_crypto import MercantilCipher
 
 
 class PagoMercantil(models.Model):
@@ -32,7 +33,8 @@ class PagoMercantil(models.Model):
         default='["b2b","c2p","tdd"]',
         help='Store as JSON string'
     )
-    invoice_number = fields.Char(string='Invoice Number', required=True)
+    invoice_number = fields.Char(
+        string='Invoice Number', required=True, index=True)
     invoice_creation_date = fields.Date(
         string='Invoice Creation Date', required=True)
     invoice_cancelled_date = fields.Date(string='Invoice Cancelled Date')
@@ -43,10 +45,16 @@ class PagoMercantil(models.Model):
         'res.currency', related='order_id.currency_id', required=True)
     payment_link = fields.Char(
         string="Payment Link", compute="_compute_payment_link")
-    webhook_response = fields.Json(string="Webhook Response")
+    webhook_response = fields.Json(
+        string="Webhook Response",
+        help="Legacy copy of the decrypted notification; new ones are kept in the webhook archive.")
+    webhook_archive_id = fields.Many2one(
+        'webhook.payload.archive', string="Webhook Payload",
+        ondelete='set null', index=True, readonly=True, copy=False)
     amount_ves = fields.Monetary(
         string='Amount in VES',
         compute='_compute_amount_ves',
+        store=True,
         currency_field='ves_currency_id'
     )
     ves_currency_id = fields.Many2one(
@@ -56,43 +64,115 @@ class PagoMercantil(models.Model):
     )
     fixed_exchange_rate = fields.Float(
         string="Fixed Exchange Rate", digits=(12, 4))
+    payment_link_cache = fields.Char(
+        string="Cached Payment Link", readonly=True, copy=False)
+    payment_link_fingerprint = fields.Char(
+        string="Payment Link Fingerprint", readonly=True, copy=False,
+        help="Hash of the inputs used to build the cached payment link.")
+    payment_link_generated_at = fields.Datetime(
+        string="Payment Link Generated At", readonly=True, copy=False)
 
     def _get_latest_bcv_rate(self):
-        latest_rate = self.env['steamtasabcv.exchange.rate'].search([
-            ('currency_id.name', '=', 'VES')
-        ], order='name desc', limit=1)
-        return latest_rate.rate if latest_rate else 1.0
+        company = self[:1].order_id.company_id or self.env.company
+        rate = self.env['steamtasabcv.exchange.rate'].get_current_rate(
+            self.env.ref('base.VES'), company)
+        return rate or 1.0
 
-    @api.depends('amount', 'webhook_response', 'invoice_number')
+    @api.depends('amount', 'fixed_exchange_rate')
     def _compute_amount_ves(self):
-        current_bcv_rate = self._get_latest_bcv_rate()
         for record in self:
             if record.fixed_exchange_rate > 0:
                 record.amount_ves = record.amount * record.fixed_exchange_rate
             elif record.amount:
-                record.amount_ves = record.amount * current_bcv_rate
+                record.amount_ves = record.amount * record._get_latest_bcv_rate()
             else:
                 record.amount_ves = 0.0
 
-    @api.depends(
-        'amount', 'customer_name', 'merchant_id', 'invoice_number',
-        'invoice_creation_date', 'contract_number', 'contract_date',
-        'trx_type', 'currency', 'payment_concepts', 'return_url'
-    )
+    @api.model
+    def _get_open_amount_ves_domain(self):
+        """Unpaid payments of live orders whose VES amount still follows the current BCV rate."""
+        return [
+            ('fixed_exchange_rate', '=', 0),
+            ('order_id.state', '!=', 'cancel'),
+            ('order_id.invoice_ids.payment_state', 'not in', ['paid', 'in_payment']),
+        ]
+
+    @api.model
+    def _cron_recompute_amount_ves(self, chunk_size=1000, auto_commit=True):
+        """Recompute the stored VES amount of open payments after a new BCV rate.
+
+        Records are processed in chunks of ``chunk_size``, committing between
+        chunks so the table is never locked for the whole run.
+        """
+        field = self._fields['amount_ves']
+        ids = self.search(self._get_open_amount_ves_domain(), order='id').ids
+        for start in range(0, len(ids), chunk_size):
+            records = self.browse(ids[start:start + chunk_size])
+            self.env.add_to_compute(field, records)
+            records.flush_recordset(['amount_ves'])
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+
+    @api.depends('payment_link_cache')
     def _compute_payment_link(self):
+        """Muestra el último enlace generado; leer el registro nunca escribe ni cifra.
+
+        El enlace se regenera explícitamente con ``generate_link_payment``
+        (al crear la orden y en ``/payment/redirect``).
+        """
         for record in self:
-            try:
-                record.payment_link = record.generate_link_payment()
-            except Exception:
-                record.payment_link = ''
+            record.payment_link = record.payment_link_cache or ''
 
     def generate_link_payment(self):
+        """Return the payment link, reusing the cached one while its inputs are unchanged.
+
+        The link is rebuilt (and re-encrypted) only when the fingerprint of
+        its inputs changes (amount, BCV rate, merchant, invoice and contract
+        data, bank configuration) or when ``pago_mercantil.payment_link_ttl``
+        seconds have passed since it was generated.
+        """
+        self.ensure_one()
+        self._refresh_amount_ves()
         mercantil_payment_url = self._get_config_key('mercantil_payment_url')
         merchant_id = self.merchant_id
         integrator_id = self._get_config_key('integrator_id')
-        custom_link = f"{mercantil_payment_url}/?merchantid={merchant_id}&transactiondata={self._encrypt_transaction_data()}&integratorid={integrator_id}"
+        json_str = json.dumps(self._build_transaction_data(), ensure_ascii=False)
+        fingerprint = hashlib.sha256('|'.join([
+            json_str,
+            str(self.fixed_exchange_rate or self._get_latest_bcv_rate()),
+            mercantil_payment_url,
+            integrator_id,
+        ]).encode('utf-8')).hexdigest()
+        if self.payment_link_cache and self.payment_link_fingerprint == fingerprint \
+                and not self._is_payment_link_expired():
+            return self.payment_link_cache
+
+        custom_link = f"{mercantil_payment_url}/?merchantid={merchant_id}&transactiondata={self._encrypt_transaction_data(json_str)}&integratorid={integrator_id}"
+        self.sudo().write({
+            'payment_link_cache': custom_link,
+            'payment_link_fingerprint': fingerprint,
+            'payment_link_generated_at': fields.Datetime.now(),
+        })
         return custom_link
 
+    def _refresh_amount_ves(self):
+        """Recompute the stored VES amount with the latest BCV rate, unless the rate is fixed.
+
+        ``amount_ves`` is otherwise only refreshed by the recompute cron, so
+        a link built right after a new rate would still use the old one.
+        """
+        records = self.filtered(lambda record: not record.fixed_exchange_rate)
+        if records:
+            self.env.add_to_compute(self._fields['amount_ves'], records)
+            records.flush_recordset(['amount_ves'])
+
+    def _is_payment_link_expired(self):
+        ttl = int(self._get_config_value('payment_link_ttl') or 3600)
+        if not self.payment_link_generated_at:
+            return True
+        return fields.Datetime.now() - self.payment_link_generated_at > timedelta(seconds=ttl)
+
     def _build_transaction_data(self):
         """Build dict for bank encryption"""
         self.ensure_one()
@@ -124,26 +204,39 @@ class PagoMercantil(models.Model):
             rec.customer_name = rec.order_id.partner_id.name
 
     def _get_config_key(self, config_key: str):
+        key = self._get_config_value(config_key)
+        if not key:
+            raise UserError(f"Missing {config_key} for mercantil payment")
+        return key
+
+    @api.model
+    @ormcache('config_key')
+    def _get_config_value(self, config_key: str):
+        """Lee ``pago_mercantil.<config_key>`` una sola vez por proceso.
+
+        ir.config_parameter limpia la caché del registro al crear, escribir o
+        borrar parámetros, por lo que un cambio de configuración se ve enseguida.
+        """
         key = self.env['ir.config_parameter'].sudo().get_param(
             f'pago_mercantil.{config_key}'
         )
-        if not key:
-            raise UserError(f"Missing {config_key} for mercantil payment")
         if isinstance(key, tuple):
             key = key[0] if key else ""
-        key = str(key).strip()
-
-        if not key:
-            raise UserError(f"{config_key} is empty")
-        return key
+        return str(key).strip() if key else ""
 
-    def _encrypt_transaction_data(self):
-        transaction_data = self._build_transaction_data()
+    @api.model
+    @ormcache()
+    def _get_aes_key(self):
+        """Clave AES de 16 bytes derivada (SHA-256) de ``pago_mercantil.secret_key``."""
         key = self._get_config_key('secret_key')
-        key_hash = hashlib.sha256(key.encode(
-            'utf-8')).digest()[:16]
-        json_str = json.dumps(transaction_data, ensure_ascii=False)
-        cipher = AES.new(key_hash, AES.MODE_ECB)
-        encrypted = cipher.encrypt(
-            pad(json_str.encode('utf-8'), AES.block_size))
-        return base64.b64encode(encrypted).decode('utf-8')
+        return hashlib.sha256(key.encode('utf-8')).digest()[:16]
+
+    @api.model
+    def _get_cipher(self):
+        return MercantilCipher(self._get_aes_key())
+
+    def _encrypt_transaction_data(self, json_str=None):
+        if json_str is None:
+            json_str = json.dumps(
+                self._build_transaction_data(), ensure_ascii=False)
+        return self._get_cipher().encrypt(json_str)
@@ -0,0 +1,57 @@
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+
+class PagoMercantilLedger(models.Model):
+    """Append-only ledger of Mercantil webhook notifications, keyed by guId.
+
+    Registering a notification is a single ``INSERT ... ON CONFLICT DO
+    NOTHING``: a concurrent or repeated delivery of the same guId finds the
+    existing row and is reported as a duplicate.
+    """
+    _name = 'sale.order.pago.mercantil.ledger'
+    _description = 'Mercantil Webhook Ledger'
+    _order = 'received_at desc, id desc'
+    _rec_name = 'guid'
+
+    guid = fields.Char(string='guId', required=True, readonly=True)
+    invoice_number = fields.Char(string='Invoice Number', readonly=True)
+    pago_id = fields.Many2one(
+        'sale.order.pago.mercantil', string='Mercantil Payment',
+        ondelete='set null', readonly=True)
+    outcome = fields.Selection([
+        ('processing', 'Processing'),
+        ('paid', 'Invoice Paid'),
+        ('invoice_not_found', 'Invoice Not Found'),
+    ], string='Outcome', default='processing', required=True, readonly=True)
+    received_at = fields.Datetime(
+        string='Received At', default=fields.Datetime.now, required=True, readonly=True)
+
+    _sql_constraints = [
+        ('unique_guid', 'UNIQUE(guid)',
+         'A Mercantil notification can only be registered once!')
+    ]
+
+    @api.model
+    def _claim(self, guid, invoice_number, pago_record):
+        """Register a notification, returning the new ledger entry.
+
+        Returns:
+            sale.order.pago.mercantil.ledger: the new entry, or an empty
+            recordset when the guId was already registered.
+        """
+        now = fields.Datetime.now()
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO sale_order_pago_mercantil_ledger
+                   (guid, invoice_number, pago_id, outcome, received_at,
+                    create_uid, create_date, write_uid, write_date)
+            VALUES (%s, %s, %s, 'processing', %s, %s, %s, %s, %s)
+            ON CONFLICT (guid) DO NOTHING
+            RETURNING id
+            """,
+            guid, invoice_number, pago_record.id or None, now,
+            self.env.uid, now, self.env.uid, now,
+        ))
+        row = self.env.cr.fetchone()
+        return self.browse(row[0]) if row else self.browse()
@@ -0,0 +1,119 @@
+import json
+import logging
+import zlib
+from datetime import timedelta
+
+from odoo import api, fields, models, tools
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+RETENTION_DAYS_PARAM = 'webhook_archive.retention_days'
+DEFAULT_RETENTION_DAYS = 90
+
+
+class WebhookPayloadArchive(models.Model):
+    """Append-only archive of raw webhook payloads, compressed with zlib.
+
+    Payloads are kept out of the operational tables (Mercantil payments,
+    Shopify inbox): those only keep a reference to the archive row. Rows
+    are never modified; ``_cron_purge`` deletes the ones older than the
+    retention period in bounded batches.
+    """
+    _name = 'webhook.payload.archive'
+    _description = 'Webhook Payload Archive'
+    _order = 'received_at desc, id desc'
+    _rec_name = 'external_id'
+
+    provider = fields.Selection([
+        ('mercantil', 'Mercantil'),
+    ], string='Provider', required=True, readonly=True)
+    external_id = fields.Char(string='External ID', readonly=True)
+    topic = fields.Char(string='Topic', readonly=True)
+    received_at = fields.Datetime(
+        string='Received At', default=fields.Datetime.now, required=True, readonly=True, index=True)
+    payload_zlib = fields.Binary(string='Compressed Payload', attachment=False, readonly=True)
+    payload_size = fields.Integer(string='Size (bytes)', readonly=True)
+    compressed_size = fields.Integer(string='Compressed Size (bytes)', readonly=True)
+    payload = fields.Text(string='Payload', compute='_compute_payload')
+
+    def init(self):
+        tools.create_index(
+            self.env.cr, 'webhook_payload_archive_provider_external_idx',
+            self._table, ['provider', 'external_id', 'received_at'])
+
+    def _compute_payload(self):
+        for record in self:
+            record.payload = zlib.decompress(record.payload_zlib).decode('utf-8') if record.payload_zlib else False
+
+    @api.model
+    def _archive(self, provider, external_id, payload, topic=None):
+        """Compress and store a payload.
+
+        Args:
+            provider (str): value of the ``provider`` selection.
+            external_id (str): provider-side identifier (guId, order id...).
+            payload (str | bytes | dict): raw body or decoded JSON.
+            topic (str, optional): event type, when the provider has one.
+
+        Returns:
+            webhook.payload.archive: the new archive row
+        """
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload, ensure_ascii=False)
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        compressed = zlib.compress(payload or b'', 6)
+        now = fields.Datetime.now()
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO webhook_payload_archive
+                   (provider, external_id, topic, received_at, payload_zlib,
+                    payload_size, compressed_size,
+                    create_uid, create_date, write_uid, write_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
+            """,
+            provider, str(external_id) if external_id else None, topic, now, compressed,
+            len(payload or b''), len(compressed),
+            self.env.uid, now, self.env.uid, now,
+        ))
+        return self.browse(self.env.cr.fetchone()[0])
+
+    def write(self, vals):
+        raise UserError("Archived webhook payloads cannot be modified.")
+
+    @api.model
+    def _cron_purge(self, batch_size=5000, max_batches=20):
+        """Delete rows older than ``webhook_archive.retention_days`` (default 90).
+
+        Each batch is its own transaction, so the purge never holds long
+        locks; when rows remain after ``max_batches`` the cron is
+        rescheduled right away.
+        """
+        days = int(self.env['ir.config_parameter'].sudo().get_param(
+            RETENTION_DAYS_PARAM, DEFAULT_RETENTION_DAYS))
+        if days <= 0:
+            return
+        cutoff = fields.Datetime.now() - timedelta(days=days)
+        deleted = 0
+        for _i in range(max_batches):
+            self.env.cr.execute(SQL(
+                """
+                DELETE FROM webhook_payload_archive
+                 WHERE id IN (SELECT id FROM webhook_payload_archive
+                               WHERE received_at < %s
+                            ORDER BY id
+                               LIMIT %s)
+                """,
+                cutoff, batch_size,
+            ))
+            count = self.env.cr.rowcount
+            deleted += count
+            self.env.cr.commit()
+            if count < batch_size:
+                break
+        else:
+            self.env.ref('pagomercantilsteam.ir_cron_purge_webhook_archive')._trigger()
+        _logger.info(f"Purged {deleted} archived webhook payloads older than {days} days")
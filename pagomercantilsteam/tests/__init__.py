@@ -0,0 +1 @@
+from . import test_mercantil_crypto
\ No newline at end of file
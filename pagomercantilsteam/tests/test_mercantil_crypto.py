@@ -0,0 +1,136 @@
+import base64
+import hashlib
+import json
+import logging
+import time
+import tracemalloc
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase
+
+from ..models.mercantil_crypto import MercantilCipher
+
+_logger = logging.getLogger(__name__)
+
+SECRET = 'mercantil-test-secret'
+BATCH_SIZE = 200
+# Mínimos muy holgados: solo detectan regresiones graves (p. ej. reconstruir
+# el cifrador por bloque o serializar el JSON varias veces).
+MIN_PAYLOADS_PER_SECOND = {'link': 2000, 'webhook_2k': 1000, 'webhook_16k': 200}
+# Pico de memoria de un lote frente al tamaño total de los textos producidos.
+MAX_PEAK_RATIO = 8
+
+
+def _transaction_data(concepts):
+    """Datos de transacción como los de ``_build_transaction_data`` con ``concepts`` conceptos."""
+    return {
+        'amount': 3649.65,
+        'customerName': 'José Pérez',
+        'returnUrl': 'https://steam.example.com/shop/confirmation',
+        'merchantId': '200284',
+        'invoiceNumber': {
+            'number': 'S00042',
+            'invoiceCreationDate': '2024-03-15',
+            'invoiceCancelledDate': '',
+        },
+        'contract': {'contractNumber': '', 'contractDate': ''},
+        'trxType': 'compra',
+        'currency': 'ves',
+        'paymentConcepts': [{
+            'concept': f'Producto {index:04d} - Tarjeta de regalo Steam',
+            'amount': 364.96,
+        } for index in range(concepts)],
+    }
+
+
+PAYLOADS = {
+    'link': _transaction_data(1),
+    'webhook_2k': _transaction_data(25),
+    'webhook_16k': _transaction_data(220),
+}
+
+
+@tagged('at_install', 'mercantil')
+class TestMercantilCipher(BaseCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.key_hash = hashlib.sha256(SECRET.encode('utf-8')).digest()[:16]
+        cls.cipher = MercantilCipher(cls.key_hash)
+
+    def test_round_trip(self):
+        for name, payload in PAYLOADS.items():
+            with self.subTest(payload=name):
+                self.assertEqual(self.cipher.decrypt(self.cipher.encrypt(payload)), payload)
+
+    def test_accepts_json_string(self):
+        payload = PAYLOADS['link']
+        json_str = json.dumps(payload, ensure_ascii=False)
+        self.assertEqual(self.cipher.encrypt(json_str), self.cipher.encrypt(payload))
+
+    def test_matches_bank_scheme(self):
+        """AES-128-ECB con la clave sha256(secreto)[:16], PKCS7 y Base64."""
+        payload = PAYLOADS['link']
+        json_str = json.dumps(payload, ensure_ascii=False)
+        expected = base64.b64encode(AES.new(self.key_hash, AES.MODE_ECB).encrypt(
+            pad(json_str.encode('utf-8'), AES.block_size))).decode('utf-8')
+        self.assertEqual(self.cipher.encrypt(payload), expected)
+
+    def test_batches_match_single_calls(self):
+        payloads = list(PAYLOADS.values())
+        encrypted = self.cipher.encrypt_many(payloads)
+        self.assertEqual(encrypted, [self.cipher.encrypt(payload) for payload in payloads])
+        self.assertEqual(self.cipher.decrypt_many(encrypted), payloads)
+        self.assertEqual(self.cipher.encrypt_many([]), [])
+
+    def test_other_key_cannot_decrypt(self):
+        encrypted = self.cipher.encrypt(PAYLOADS['link'])
+        other = MercantilCipher(hashlib.sha256(b'otra-clave').digest()[:16])
+        with self.assertRaises(ValueError):
+            other.decrypt(encrypted)
+
+    def test_invalid_input_raises_value_error(self):
+        for data in ['no es base64', base64.b64encode(b'corto').decode(), '']:
+            with self.subTest(data=data), self.assertRaises(ValueError):
+                self.cipher.decrypt(data)
+
+    def test_benchmark_batches(self):
+        for name, payload in PAYLOADS.items():
+            with self.subTest(payload=name):
+                batch = [payload] * BATCH_SIZE
+                size = len(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+                started = time.perf_counter()
+                encrypted = self.cipher.encrypt_many(batch)
+                encrypt_rate = BATCH_SIZE / (time.perf_counter() - started)
+                started = time.perf_counter()
+                self.cipher.decrypt_many(encrypted)
+                decrypt_rate = BATCH_SIZE / (time.perf_counter() - started)
+
+                output_size = sum(len(data) for data in encrypted)
+                tracemalloc.start()
+                try:
+                    self.cipher.encrypt_many(batch)
+                    _current, encrypt_peak = tracemalloc.get_traced_memory()
+                    tracemalloc.reset_peak()
+                    self.cipher.decrypt_many(encrypted)
+                    _current, decrypt_peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+
+                _logger.info(
+                    "MercantilCipher %s (%d bytes): encrypt %.0f payloads/s, peak %d KiB; "
+                    "decrypt %.0f payloads/s, peak %d KiB (batch of %d)",
+                    name, size, encrypt_rate, encrypt_peak // 1024,
+                    decrypt_rate, decrypt_peak // 1024, BATCH_SIZE)
+                floor = MIN_PAYLOADS_PER_SECOND[name]
+                self.assertGreater(encrypt_rate, floor,
+                                   f"encrypt_many {name}: {encrypt_rate:.0f} payloads/s, floor is {floor}")
+                self.assertGreater(decrypt_rate, floor,
+                                   f"decrypt_many {name}: {decrypt_rate:.0f} payloads/s, floor is {floor}")
+                self.assertLess(encrypt_peak, output_size * MAX_PEAK_RATIO)
+                self.assertLess(decrypt_peak, output_size * MAX_PEAK_RATIO)
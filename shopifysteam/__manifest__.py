@@ -1,6 +1,6 @@
 {
     "name": "Shopify Steam",
-    "version": "19.0.0.1",
+    "version": "19.0.0.2",
     "category": "Sales",
     "depends": ["base", "account", "sale", "sale_management", "mail", "pagomercantilsteam", "steamtasabcv"],
     "description": """
@@ -21,6 +21,10 @@
         'data/payment_method_view.xml',
         'data/payment_method_data.xml',
         'data/account_payment_view.xml',
+        'data/shopify_webhook_inbox_view.xml',
+        'data/shopify_order_import_view.xml',
+        'data/mercantil_payment_report_view.xml',
+        'data/cron_data.xml',
         'security/ir.model.access.csv', 
     ],
 }
@@ -3,16 +3,17 @@ import hashlib
 import hmac
 import json
 import logging
-from datetime import datetime
 from typing import Any, Dict
 
-import pytz
 import werkzeug
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import unpad
-from odoo import fields, http
+from odoo import http
 from odoo.http import request
 
+from odoo.addons.pagomercantilsteam.models.mercantil_crypto import MercantilCipher
+
+from ..models.shopify_webhook_inbox import SUPPORTED_TOPICS
+from ..models.webhook_metrics import METRICS, WebhookTimer, stage
+
 _logger = logging.getLogger(__name__)
 
 
@@ -34,28 +35,31 @@ class WebhookController(http.Controller):
 
     @http.route('/v1/webhooks/mercantil/payment/confirmation', type='http', auth='public', csrf=False)
     def mercantil_confirm_payment(self, **kwargs):
+        with WebhookTimer('mercantil_payment', request.env):
+            return self._mercantil_confirm_payment()
+
+    def _mercantil_confirm_payment(self):
         raw_data = request.httprequest.data
         try:
             data = json.loads(raw_data)
-            _logger.info(f"Received encrypted webhook data: {data}")
+            _logger.debug(f"Received Mercantil webhook ({len(raw_data)} bytes)")
             encrypted_data = data.get('data')
             if not encrypted_data:
                 _logger.error("No 'data' field found in webhook")
                 # Escribir formato de error
                 return self._json_response({}, 200)
-            secret_key = request.env['ir.config_parameter'].sudo(
-            ).get_param('pago_mercantil.secret_key')
-            if not secret_key:
+            PagoMercantil = request.env['sale.order.pago.mercantil'].sudo()
+            if not PagoMercantil._get_config_value('secret_key'):
                 _logger.error("Mercantil secret key not configured")
                 # Escribir formato de error
                 return self._json_response({}, 200)
-            decrypted_data = self._decrypt_mercantil_data(
-                encrypted_data, secret_key)
+            with stage('decrypt'):
+                decrypted_data = self._decrypt_mercantil_data(
+                    encrypted_data, PagoMercantil._get_aes_key())
             if not decrypted_data:
                 _logger.error("Failed to decrypt webhook data")
                 # Escribir formato de error
                 return self._json_response({}, 400)
-            _logger.info(f"Decrypted webhook data: {decrypted_data}")
             # Extract webhook notification data
             webhook_notification = decrypted_data.get(
                 'webhookNotificationIn', {})
@@ -64,74 +68,79 @@ class WebhookController(http.Controller):
             guid = info_msg.get('guId')
             if not numero_factura:
                 _logger.error("No numeroFactura found in decrypted data")
+                self._archive_mercantil_payload(decrypted_data, guid, numero_factura)
                 # Escribir formato de error
                 return self._json_response({}, 400)
-            PagoMercantil = request.env['sale.order.pago.mercantil'].sudo()
-            pago_record = PagoMercantil.search(
-                [('invoice_number', '=', numero_factura)], limit=1)
+            with stage('lookup_pago'):
+                pago_record = PagoMercantil.search(
+                    [('invoice_number', '=', numero_factura)], limit=1)
 
             if not pago_record:
                 _logger.warning(f"Invoice number {numero_factura} not found")
+                self._archive_mercantil_payload(decrypted_data, guid, numero_factura)
                 return self._json_response({
                     "status": "error",
                     "message": "Invoice doesn't exist",
                     "numeroFactura": numero_factura
                 }, 200)
-            if pago_record.webhook_response:
-                try:
-                    existing_data = json.loads(pago_record.webhook_response)
-                    existing_guid = existing_data.get(
-                        'infoMsg', {}).get('guId')
-                    if existing_guid == guid:
-                        _logger.info(
-                            f"Duplicate webhook detected for invoice {numero_factura}, guId: {guid}")
-                        response = self._build_mercantil_response(
-                            info_msg, 0, "06", "Notificación duplicada",
-                            "Webhook already processed", guid
-                        )
-                        return self._json_response(response, 200)
-                except json.JSONDecodeError:
-                    _logger.warning(
-                        f"Failed to decode existing webhook_response for invoice {numero_factura}")
-            invoice = request.env['account.move'].sudo().search([
-                ('ref', '=', numero_factura),
-                ('payment_state', 'not in', ['paid', 'in_payment'])
-            ], limit=1)
+            ledger_entry = None
+            if guid:
+                with stage('ledger_claim'):
+                    ledger_entry = request.env['sale.order.pago.mercantil.ledger'].sudo()._claim(
+                        guid, numero_factura, pago_record)
+                if not ledger_entry:
+                    _logger.info(
+                        f"Duplicate webhook detected for invoice {numero_factura}, guId: {guid}")
+                    response = self._build_mercantil_response(
+                        info_msg, 0, "06", "Notificación duplicada",
+                        "Webhook already processed", guid
+                    )
+                    return self._json_response(response, 200)
+            # Solo se archiva la primera entrega: los duplicados no agregan filas
+            archive = self._archive_mercantil_payload(decrypted_data, guid, numero_factura)
+            invoice = pago_record.order_id.invoice_ids.filtered(
+                lambda inv: inv.move_type == 'out_invoice' and inv.state == 'posted'
+                and inv.payment_state not in ['paid', 'in_payment'])[:1]
             current_rate = pago_record._get_latest_bcv_rate()
             if invoice:
-                pm_method = request.env['sale.payment.method'].sudo().search([
-                    ('name', '=', 'pm_bank_transfer')
-                ], limit=1)
-                if not pm_method:
-                    pm_method = request.env['account.payment.method'].sudo().search([
-                        ('code', '=', 'manual')
+                with stage('register_payment'):
+                    pm_method = request.env['sale.payment.method'].sudo().search([
+                        ('name', '=', 'pm_bank_transfer')
                     ], limit=1)
-                payment_register = request.env['account.payment.register'].sudo().with_context(
-                    active_model='account.move',
-                    active_ids=invoice.ids
-                ).create({
-                    'journal_id': request.env['account.journal'].sudo().search([('type', '=', 'bank')], limit=1).id,
-                    'mercantil_payment': pago_record.id,
-                    'payment_method_id': pm_method.id if pm_method else False
-                })
-                payment_register.action_create_payments()
+                    if not pm_method:
+                        pm_method = request.env['account.payment.method'].sudo().search([
+                            ('code', '=', 'manual')
+                        ], limit=1)
+                    payment_register = request.env['account.payment.register'].sudo().with_context(
+                        active_model='account.move',
+                        active_ids=invoice.ids
+                    ).create({
+                        'journal_id': request.env['account.journal'].sudo().search([('type', '=', 'bank')], limit=1).id,
+                        'mercantil_payment': pago_record.id,
+                        'payment_method_id': pm_method.id if pm_method else False
+                    })
+                    payment_register.action_create_payments()
 
                 _logger.info(
                     f"Invoice {numero_factura} marked as paid via Mercantil webhook.")
-
+                outcome = 'paid'
             else:
                 _logger.error(
                     f"Invoice {numero_factura} found in custom logs but not in account.move or already paid.")
-            pago_record.write({
-                'webhook_response': json.dumps(decrypted_data, ensure_ascii=False),
-                'fixed_exchange_rate': current_rate
-            })
+                outcome = 'invoice_not_found'
+            if ledger_entry:
+                ledger_entry.outcome = outcome
+            with stage('save_response'):
+                pago_record.write({
+                    'webhook_archive_id': archive.id,
+                    'fixed_exchange_rate': current_rate
+                })
             _logger.info(
                 f"Webhook response saved for invoice {numero_factura}")
             response = self._build_mercantil_response(
                 info_msg, 0, "00", "Notificacion recibida con éxito!", "Notificacion recibida con éxito!!", guid
             )
-            _logger.info(response)
+            _logger.debug(f"Mercantil webhook response: {response}")
             return self._json_response(response, 200)
 
         except json.JSONDecodeError as e:
@@ -141,8 +150,19 @@ class WebhookController(http.Controller):
         except Exception as e:
             _logger.error(
                 f"Unexpected error processing Mercantil webhook: {str(e)}")
+            # Descartar también el registro del ledger para que Mercantil pueda reintentar
+            request.env.cr.rollback()
             return self._json_response({"error": "Internal server error"}, 500)
 
+    def _archive_mercantil_payload(self, decrypted_data, guid, numero_factura):
+        with stage('archive'):
+            archive = request.env['webhook.payload.archive'].sudo()._archive(
+                'mercantil', guid or numero_factura, decrypted_data,
+                topic='payment/confirmation')
+        _logger.info(
+            f"Mercantil webhook for invoice {numero_factura} (guId: {guid}) archived as {archive.id}")
+        return archive
+
     @http.route('/payment/redirect/<int:order_id>', type='http', auth='public', csrf=False)
     def payment_redirect(self, order_id, **kwargs):
         """
@@ -178,232 +198,95 @@ class WebhookController(http.Controller):
             _logger.error(f"Error generating payment link: {str(e)}")
             return request.make_response("Error generating payment link. Please try again later.", status=500)
 
-    @http.route('/v1/webhooks/shopify/orders', type='http', auth='public', methods=['POST'], csrf=False)
+    @http.route(['/v1/webhooks/shopify/orders', '/v1/webhooks/shopify/refunds'],
+                type='http', auth='public', methods=['POST'], csrf=False)
     def shopify_order_created(self, **kwargs):
-        """Toma el objeto Order enviado por Shopify y lo procesa para convertirlo en una orden en Odoo.
+        """Valida el webhook enviado por Shopify y lo guarda en la bandeja de webhooks.
+
+        Atiende ``orders/create``, ``orders/updated``, ``orders/paid`` y
+        ``refunds/create`` según la cabecera ``X-Shopify-Topic``. La orden en
+        Odoo la crea o actualiza luego el cron de ``shopify.webhook.inbox``.
 
         params:
         self: instancia misma del objeto
         **kwargs:  cuerpo de la petición
         """
+        with WebhookTimer('shopify_orders', request.env):
+            return self._shopify_order_created()
+
+    def _shopify_order_created(self):
         raw_data = request.httprequest.data
         hmac_header = request.httprequest.headers.get('X-Shopify-Hmac-Sha256')
-        if not self._verify_webhook(raw_data, hmac_header):
+        with stage('verify_hmac'):
+            verified = self._verify_webhook(raw_data, hmac_header)
+        if not verified:
             _logger.warning("Unauthorized Shopify webhook attempt detected.")
             return self._json_response({'message': 'Unauthorized'}, status=401)
         try:
-            data = json.loads(raw_data)
+            with stage('parse'):
+                data = json.loads(raw_data)
         except (json.JSONDecodeError, TypeError):
             _logger.error("Failed to decode JSON from Shopify webhook")
             return self._json_response({'message': 'Invalid JSON'}, status=200)
         if not data:
             return self._json_response({'message': 'Empty request body'}, 200)
-        env = request.env['res.users'].sudo().env
-        if data.get('financial_status') == 'voided':
+        headers = request.httprequest.headers
+        default_topic = 'refunds/create' if request.httprequest.path.endswith('/refunds') else 'orders/create'
+        topic = headers.get('X-Shopify-Topic') or default_topic
+        if topic not in SUPPORTED_TOPICS:
+            _logger.info("Ignoring unsupported Shopify topic %s", topic)
+            return self._json_response({"reason": "unsupported topic"}, 200)
+        if topic == 'orders/create' and data.get('financial_status') == 'voided':
             _logger.info("Ignoring Shopify Order %s: Status is VOIDED",
                          data.get('name'))
             return self._json_response({"reason": "voided"}, 200)
-        existing_order = env['sale.order'].search([
-            ('client_order_ref', '=', str(data.get('id')))
-        ], limit=1)
-
-        if existing_order:
-            return self._json_response({"message": "Order already exists", "odoo_id": existing_order.id}, 200)
-        try:
-            shopify_customer = data.get('customer')
-            partner_id = self._get_or_create_partner(
-                env, shopify_customer, data)
-            partner = env['res.partner'].search([
-                ('id', '=', partner_id)
-            ], limit=1)
-            order_lines = []
-            for item in data.get('line_items', []):
-                product_id = self._get_or_create_product(env, item)
-                order_lines.append(fields.Command.create({
-                    'product_id': product_id,
-                    'product_uom_qty': item.get('quantity'),
-                    'price_unit': float(item.get('price', 0.0)),
-                    'name': item.get('title'),
-                }))
-
-            created_at = data.get('created_at')
-
-            if not created_at:
-                order_date = fields.Datetime.now()
-            else:
-                dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                order_date = dt.astimezone(pytz.utc).replace(tzinfo=None)
-            default_pm = env.ref('shopifysteam.pm_mobile_payment').id
-            shipping_data = data.get('shipping_lines', [])
-            shipping_name = shipping_data[0].get(
-                'title') if shipping_data else 'No Shipping'
-            delivery_method = env['sale.delivery.method'].search(
-                [('name', '=', shipping_name.strip().lower().replace(' ', '_'))], limit=1)
-            default_dm = env.ref('shopifysteam.dm_standard').id
-            gateways = data.get('payment_gateway_names', [])
-            default_pm = env.ref('shopifysteam.pm_mobile_payment').id
-            billing_data = self._get_billing_address(env, data)
-            _logger.info(billing_data)
-            note_content = (
-                f"--- INFORMACIÓN DE DESPACHO ---\n"
-                f"Método de Envío: {default_dm}\n"
-                f"Pasarela de Pago: {default_pm}\n\n"
-                f"--- DIRECCIÓN DE FACTURACIÓN ---\n"
-                f"{partner.name}\n"
-                f"{billing_data.get('street')}, {billing_data.get('street2') or ''}\n"
-                f"{billing_data.get('city')}, {billing_data.get('province') or ''} {billing_data.get('zip') or ''}\n"
-                f"Tel: {billing_data.get('phone') or partner.phone or 'N/A'}\n\n"
-                f"--- NOTAS ADICIONALES ---\n"
-                f"Por favor, si su pago es por transferencia o Pago Móvil, "
-                f"envíe el comprobante al correo de contacto."
-            )
-            new_order = env['sale.order'].create({
-                'partner_id': partner_id,
-                'origin': data.get('name'),  # e.g. #9999
-                'client_order_ref': str(data.get('id')),  # Shopify Internal ID
-                'order_line': order_lines,
-                'date_order': order_date,
-                'company_id': env.company.id,
-                'delivery_method_id': delivery_method or default_dm,
-                'note': note_content
-            })
-            shopify_status = data.get('financial_status')
-
-            if shopify_status == 'paid':
-                new_order.action_confirm()
-                invoice = new_order._create_invoices(final=True)
-                invoice.action_post()
-                journal = env['account.journal'].search(
-                    [('code', '=', 'BNK1')], limit=1)
-
-                if not journal:
-                    _logger.error("Bank Journal with code 'BNK1' not found!")
-                    journal = env['account.journal'].search(
-                        [('type', '=', 'bank')], limit=1)
-                payment = env['account.payment'].create({
-                    'amount': invoice.amount_total,
-                    'payment_type': 'inbound',
-                    'partner_type': 'customer',
-                    'journal_id': journal.id,
-                    'partner_id': partner_id,
-                    'memo': f"Shopify {data.get('name')}",
-                })
-                payment.action_post()
-                # (payment.move_id.line_ids + invoice.line_ids).filtered(
-                #     lambda l: l.account_id.account_type == 'asset_receivable' and not l.reconciled
-                # ).reconcile()
-                return self._json_response({"message": "Order Created and Paid"}, 200)
-            elif shopify_status in ['voided', 'refunded']:
-                new_order.action_cancel()
-                return self._json_response({"message": "Order Created and Cancelled"}, 200)
-            else:
-                new_order.action_confirm()
-                invoice = new_order._create_invoices(final=True)
-                invoice.action_post()
-                merchant_id = new_order.company_id.mercantil_merchant_id
-                if not merchant_id:
-                    _logger.error(
-                        "Mercantil Merchant ID not configured for company %s", new_order.company_id.name)
-                    return self._json_response({"message": "Merchant ID missing"}, 200)
-                mercantil_payment = env['sale.order.pago.mercantil'].create({
-                    'order_id': new_order.id,
-                    'merchant_id': merchant_id,
-                    'return_url': "https://megalabs.steamsolutions.tech/payment/processing",
-                    'invoice_number': new_order.client_order_ref or new_order.name,
-                    'invoice_creation_date': new_order.date_order.date() if new_order.date_order else fields.Date.today(),
-                    'invoice_cancelled_date': new_order.date_order.date() if new_order.date_order else fields.Date.today(),
-                    'contract_number': new_order.id,
-                    'contract_date': new_order.date_order.date() if new_order.date_order else fields.Date.today(),
-                    'trx_type': 'compra'
-                })
-                self._send_new_order_email(new_order, None)
-                return self._json_response({"message": "Order Draft Created, Link Sent"}, 200)
-
-        except Exception as e:
-            _logger.error("Shopify Sync Error: %s", str(e))
-            env.cr.rollback()
-            return self._json_response({"message": "error"}, 500)
-
-    def _get_billing_address(self, env, request: Dict):
-        billing = request.get("billing_address") or {}
-        country = env['res.country'].search(
-            [('code', '=', billing.get('country_code'))], limit=1)
-        state = env['res.country.state'].search([
-            ('name', '=', billing.get('province')),
-            ('country_id', '=', country.id)
-        ], limit=1) if country else None
-        return {
-            'street': billing.get('address1'),
-            'street2': billing.get('address2'),
-            'city': billing.get('city'),
-            'zip': billing.get('zip'),
-            'state_id': state.id if state else False,
-            'country_id': country.id if country else False,
-            'phone': billing.get('phone'),
-        }
-
-    def _get_or_create_partner(self, env, shopify_cust, request):
-        data = request.get("shipping_address")
-        phone = data.get("phone") if data else shopify_cust.get(
-            'billing_address', {}).get('phone')
-
-        partner = env['res.partner'].search([
-            '|',
-            ('email', '=', shopify_cust.get('email')),
-            ('ref', '=', str(shopify_cust.get('id')))
-        ], limit=1)
-
-        if not partner:
-            partner = env['res.partner'].create({
-                'name': f"{shopify_cust.get('first_name', '')} {shopify_cust.get('last_name', '')}".strip(),
-                'email': shopify_cust.get('email'),
-                'phone': phone,
-                'ref': str(shopify_cust.get('id')),
-            })
-            billing = request.get('billing_address', {})
-            if billing:
-                country = env['res.country'].search(
-                    [('code', '=', billing.get('country_code'))], limit=1)
-                state = env['res.country.state'].search([
-                    ('name', '=', billing.get('province')),
-                    ('country_id', '=', country.id)
-                ], limit=1) if country else None
-
-                partner.write({
-                    'street': billing.get('address1'),
-                    'street2': billing.get('address2'),  # don't hardcode None
-                    'city': billing.get('city'),
-                    'zip': billing.get('zip'),
-                    'state_id': state.id if state else False,
-                    'country_id': country.id if country else False,
-                    # optional: preserve billing phone
-                    'phone': billing.get('phone') or phone,
-                })
-
-        return partner.id
-
-    def _get_or_create_product(self, env, item):
-        sku = item.get('sku')
-        product = env['product.product'].search(
-            [('default_code', '=', sku)], limit=1)
-        if not product:
-            product = env['product.product'].create({
-                'name': item.get('title'),
-                'default_code': sku,
-                'list_price': float(item.get('price', 0.0)),
-                'type': 'consu',
-            })
-        return product.id
+        # El procesamiento se hace en segundo plano (ver shopify.webhook.inbox)
+        # para responder a Shopify antes de que expire su timeout.
+        with stage('enqueue'):
+            item, created = request.env['shopify.webhook.inbox'].sudo()._enqueue(
+                data, raw_data.decode('utf-8'),
+                shop=headers.get('X-Shopify-Shop-Domain'),
+                webhook_id=headers.get('X-Shopify-Webhook-Id'),
+                topic=topic)
+        if not item:
+            return self._json_response({"message": "No changes"}, 200)
+        if not created:
+            return self._json_response({
+                "message": item.result_message or "Webhook already received",
+                "inbox_id": item.id,
+                "status": item.state,
+                "odoo_id": item.sale_order_id.id,
+            }, 200)
+        return self._json_response({"message": "Order queued", "inbox_id": item.id}, 200)
+
+    @http.route('/v1/webhooks/metrics', type='http', auth='none', methods=['GET'], csrf=False, save_session=False)
+    def webhook_metrics(self, **kwargs):
+        """Histogramas de duración y consultas SQL por etapa, en formato Prometheus.
+
+        Requiere la cabecera ``Authorization: Bearer <token>`` con el valor de
+        ``shopifysteam.metrics_token``; sin token configurado el endpoint no
+        existe. Los valores son los del worker que atiende la petición.
+        """
+        token = request.env['ir.config_parameter'].sudo().get_param('shopifysteam.metrics_token')
+        authorization = request.httprequest.headers.get('Authorization') or ''
+        if not token or not hmac.compare_digest(authorization, f"Bearer {token}"):
+            return request.not_found()
+        return request.make_response(
+            METRICS.render_prometheus(),
+            headers=[('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')])
 
     def _verify_webhook(self, data, hmac_header):
         """Standard Shopify HMAC verification logic"""
         if not hmac_header:
             return False
 
-        shopify_secret = self.env['ir.config_parameter'].sudo(  # pyright: ignore[reportOptionalSubscript]
-        ).get_param('shopify.api_secret')
+        shopify_secret = request.env['shopify.webhook.inbox'].sudo(
+        )._get_shopify_secret()
+        if not shopify_secret:
+            _logger.error("Shopify API secret not configured")
+            return False
         digest = hmac.new(
-            shopify_secret.encode('utf-8'),
+            shopify_secret,
             data,
             hashlib.sha256
         ).digest()
@@ -411,63 +294,20 @@ class WebhookController(http.Controller):
         computed_hmac = base64.b64encode(digest).decode()
         return hmac.compare_digest(computed_hmac, hmac_header)
 
-    def _send_new_order_email(self, sale_order, custom_link=None):
-        """
-        Calculates the VES total and latest rate to send in the email.
-        """
-        template = self.env.ref('shopifysteam.new_sale_order_emailv1').sudo()
-        base_url = self.env['ir.config_parameter'].sudo(
-        ).get_param('web.base.url')
-        dynamic_link = f"{base_url}/payment/redirect/{sale_order.id}"
-
-        latest_rate_record = request.env['steamtasabcv.exchange.rate'].sudo().search([
-            ('currency_id.name', '=', 'VES'),
-            ('active', '=', True)
-        ], order='name desc, id desc', limit=1)
-        current_rate = latest_rate_record.rate if latest_rate_record else 1.0
-        total_ves = sale_order.amount_total * current_rate
-        _logger.info(
-            f"Sending email for {sale_order.name} - Rate: {current_rate} - Total VES: {total_ves}")
-
-        template.with_context(
-            custom_link=dynamic_link,
-            current_bcv_rate=current_rate,
-            total_in_ves=total_ves,
-            special_note='',
-            tracking_number='TRK-%s' % sale_order.name,
-            default_email_from="megalabs@steamsolutions.tech"
-        ).sudo().send_mail(sale_order.id, force_send=True)
-
-        return True
-
-    def _decrypt_mercantil_data(self, encrypted_data, secret_key):
+    def _decrypt_mercantil_data(self, encrypted_data, key_hash):
         """
         Descifra datos que fueron encriptados utilizando el modo AES ECB.
 
         Args:
             encrypted_data (str): Cadena encriptada codificada en Base64.
-            secret_key (str): La clave secreta para el descifrado.
+            key_hash (bytes): Clave AES derivada de la clave secreta
+                (ver ``sale.order.pago.mercantil._get_aes_key``).
 
         Returns:
             dict: Los datos JSON descifrados como un diccionario, o None si ocurre un error.
         """
         try:
-            # Generar el mismo hash de clave utilizado para la encriptación
-            key_hash = hashlib.sha256(secret_key.encode('utf-8')).digest()[:16]
-
-            # Decodificar base64
-            encrypted_bytes = base64.b64decode(encrypted_data)
-
-            # Descifrar usando modo AES ECB
-            cipher = AES.new(key_hash, AES.MODE_ECB)
-            decrypted_padded = cipher.decrypt(encrypted_bytes)
-
-            # Eliminar el relleno (padding)
-            decrypted = unpad(decrypted_padded, AES.block_size)
-
-            # Convertir a JSON
-            json_str = decrypted.decode('utf-8')
-            return json.loads(json_str)
+            return MercantilCipher(key_hash).decrypt(encrypted_data)
         except Exception as e:
             _logger.error(f"Error descifrando datos de Mercantil: {str(e)}")
             return None
@@ -0,0 +1,29 @@
+def migrate(cr, version):
+    """Carga en shopify.sync.map las órdenes y clientes creados antes de que existiera."""
+    if not version:
+        return
+    cr.execute("""
+        INSERT INTO shopify_sync_map
+               (shop, resource_type, shopify_id, res_model, res_id,
+                create_uid, create_date, write_uid, write_date)
+        SELECT '', 'order', so.client_order_ref, 'sale.order', MIN(so.id),
+               1, now() at time zone 'utc', 1, now() at time zone 'utc'
+          FROM sale_order so
+         WHERE so.client_order_ref ~ '^[0-9]+$'
+      GROUP BY so.client_order_ref
+        ON CONFLICT DO NOTHING
+    """)
+    cr.execute("""
+        INSERT INTO shopify_sync_map
+               (shop, resource_type, shopify_id, res_model, res_id,
+                create_uid, create_date, write_uid, write_date)
+        SELECT '', 'customer', rp.ref, 'res.partner', MIN(rp.id),
+               1, now() at time zone 'utc', 1, now() at time zone 'utc'
+          FROM res_partner rp
+         WHERE rp.ref ~ '^[0-9]+$'
+           AND EXISTS (SELECT 1 FROM sale_order so
+                        WHERE so.partner_id = rp.id
+                          AND so.client_order_ref ~ '^[0-9]+$')
+      GROUP BY rp.ref
+        ON CONFLICT DO NOTHING
+    """)
@@ -1,4 +1,11 @@
+from . import registry_cache_mixin
 from . import sale_order
 from . import payment_method
 from . import delivery_method
-from . import account_payment
\ No newline at end of file
+from . import account_payment
+from . import shopify_webhook_inbox
+from . import res_country
+from . import shopify_sync_map
+from . import shopify_order_import
+from . import webhook_payload_archive
+from . import res_partner
\ No newline at end of file
@@ -1,8 +1,16 @@
-from odoo import models, fields
+from odoo import api, models, fields
+from odoo.tools import ormcache
 
 class DeliveryMethod(models.Model):
     _name = 'sale.delivery.method'
+    _inherit = ['shopify.registry.cache.mixin']
     _description = 'Delivery Method'
 
     name = fields.Char('Name', required=True, translate=True)
-    active = fields.Boolean(default=True)
\ No newline at end of file
+    active = fields.Boolean(default=True)
+
+    @api.model
+    @ormcache('name', 'self.env.lang')
+    def _get_id_by_name(self, name):
+        # name es traducible: la búsqueda depende del idioma del contexto
+        return self.search([('name', '=', name)], limit=1).id
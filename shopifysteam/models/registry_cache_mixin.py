@@ -0,0 +1,27 @@
+from odoo import api, models
+
+
+class ShopifyRegistryCacheMixin(models.AbstractModel):
+    """Limpia la caché del registro al crear, modificar o borrar registros.
+
+    Para modelos cuyos datos alimentan métodos con ``ormcache`` (búsquedas
+    por nombre o código usadas al importar órdenes de Shopify).
+    """
+    _name = 'shopify.registry.cache.mixin'
+    _description = 'Registry Cache Invalidation Mixin'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
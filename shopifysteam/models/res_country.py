@@ -0,0 +1,46 @@
+import unicodedata
+
+from odoo import api, models
+from odoo.tools import ormcache
+
+
+def _normalize_name(value):
+    """Quita acentos, espacios extremos y mayúsculas: 'Distrito Capital ' -> 'distrito capital'."""
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', value.strip())
+    return ''.join(c for c in value if not unicodedata.combining(c)).casefold()
+
+
+class ResCountry(models.Model):
+    _name = 'res.country'
+    _inherit = ['res.country', 'shopify.registry.cache.mixin']
+
+    @api.model
+    def _resolve_country_state(self, country_code, province):
+        """Devuelve ``(country_id, state_id)`` para un par código de país / provincia.
+
+        Las claves se normalizan antes de consultar la caché, de modo que
+        'Mérida', 'merida' y 'MERIDA' comparten la misma entrada.
+        """
+        return self._resolve_country_state_cached(
+            (country_code or '').strip().upper(), _normalize_name(province))
+
+    @api.model
+    @ormcache('country_code', 'province_key')
+    def _resolve_country_state_cached(self, country_code, province_key):
+        if not country_code:
+            return False, False
+        country = self.sudo().with_context(active_test=False).search(
+            [('code', '=', country_code)], limit=1)
+        if not country or not province_key:
+            return country.id, False
+        for state in country.state_ids:
+            if province_key in (_normalize_name(state.name), _normalize_name(state.code)):
+                return country.id, state.id
+        return country.id, False
+
+
+class ResCountryState(models.Model):
+    _name = 'res.country.state'
+    _inherit = ['res.country.state', 'shopify.registry.cache.mixin']
@@ -0,0 +1,113 @@
+import logging
+import re
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_PHONE_COUNTRY_CODE = 58  # Venezuela
+MERGE_GROUP_SIZE = 3  # máximo que acepta base.partner.merge.automatic.wizard
+
+
+def normalize_phone(phone, country_code=DEFAULT_PHONE_COUNTRY_CODE):
+    """Lleva un teléfono a formato E.164: '0412-123.45.67' -> '+584121234567'.
+
+    Los números sin prefijo internacional toman ``country_code``; el 0 de
+    larga distancia nacional se descarta.
+    """
+    if not phone:
+        return False
+    phone = phone.strip()
+    digits = re.sub(r'\D', '', phone)
+    if phone.startswith('+'):
+        number = digits
+    elif digits.startswith('00'):
+        number = digits[2:]
+    elif digits.startswith(str(country_code)) and len(digits) > 10:
+        # '58 412 1234567': ya trae el código de país, sin el '+'
+        number = digits
+    else:
+        number = f"{country_code}{digits.lstrip('0')}"
+    return f"+{number}" if 8 <= len(number) <= 15 else False
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    shopify_phone_key = fields.Char(
+        string='Normalized Phone (E.164)', compute='_compute_shopify_phone_key',
+        store=True, index=True, copy=False)
+
+    @api.depends('phone', 'country_id.phone_code')
+    def _compute_shopify_phone_key(self):
+        for partner in self:
+            partner.shopify_phone_key = normalize_phone(
+                partner.phone, partner.country_id.phone_code or DEFAULT_PHONE_COUNTRY_CODE)
+
+    @api.model
+    def _cron_merge_shopify_duplicates(self, batch_size=100, auto_commit=True):
+        """Fusiona los clientes de Shopify duplicados por email normalizado.
+
+        Solo se consideran clientes de Shopify (registrados en
+        ``shopify.sync.map``) que son personas sin contacto padre, no son
+        usuarios ni la empresa de una compañía. El teléfono no basta para
+        fusionar: varias personas pueden compartir un número. En cada grupo
+        se conserva el contacto más antiguo; las entradas de
+        ``shopify.sync.map`` de los demás pasan a apuntar a él antes de
+        fusionarlos.
+        """
+        merged = 0
+        for partner_ids in self._get_duplicate_groups('email_normalized', batch_size):
+            try:
+                with self.env.cr.savepoint():
+                    merged += self._merge_shopify_duplicates(partner_ids)
+            except Exception as e:
+                _logger.warning(f"Could not merge partners {partner_ids}: {e}")
+            if auto_commit:
+                self.env.cr.commit()
+        _logger.info(f"Merged {merged} duplicate partners")
+        return merged
+
+    @api.model
+    def _get_duplicate_groups(self, key_field, limit):
+        """Ids de clientes de Shopify que comparten ``key_field``, agrupados y ordenados por antigüedad."""
+        self.env.flush_all()
+        self.env.cr.execute(SQL(
+            """
+            SELECT array_agg(rp.id ORDER BY rp.id)
+              FROM res_partner rp
+             WHERE rp.%s IS NOT NULL
+               AND rp.active
+               AND NOT rp.is_company
+               AND rp.parent_id IS NULL
+               AND NOT EXISTS (SELECT 1 FROM res_users u WHERE u.partner_id = rp.id)
+               AND NOT EXISTS (SELECT 1 FROM res_company c WHERE c.partner_id = rp.id)
+               AND EXISTS (SELECT 1 FROM shopify_sync_map m
+                            WHERE m.resource_type = 'customer'
+                              AND m.res_model = 'res.partner'
+                              AND m.res_id = rp.id)
+          GROUP BY rp.%s
+            HAVING count(*) > 1
+             LIMIT %s
+            """,
+            SQL.identifier(key_field), SQL.identifier(key_field), limit,
+        ))
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def _merge_shopify_duplicates(self, partner_ids):
+        destination = self.browse(partner_ids[0])
+        sources = self.browse(partner_ids[1:]).exists()
+        if not sources:
+            return 0
+        self.env['shopify.sync.map'].sudo().search([
+            ('res_model', '=', 'res.partner'),
+            ('res_id', 'in', sources.ids),
+        ]).write({'res_id': destination.id})
+        Wizard = self.env['base.partner.merge.automatic.wizard'].sudo()
+        for start in range(0, len(sources), MERGE_GROUP_SIZE - 1):
+            batch = sources[start:start + MERGE_GROUP_SIZE - 1]
+            # extra_checks=False: los clientes de Shopify tienen facturas propias
+            Wizard._merge((destination + batch).ids, destination, extra_checks=False)
+        return len(sources)
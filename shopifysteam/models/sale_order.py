@@ -1,4 +1,11 @@
-from odoo import models, fields
+import logging
+
+from odoo import api, models, fields
+
+from .webhook_metrics import stage
+
+_logger = logging.getLogger(__name__)
+
 
 class SaleOrder(models.Model):
     _inherit = 'sale.order'
@@ -6,4 +13,75 @@ class SaleOrder(models.Model):
     delivery_method_id = fields.Many2one(
         'sale.delivery.method',
         string='Delivery Method'
-    )
\ No newline at end of file
+    )
+    shopify_state_hash = fields.Char(
+        string='Shopify State Hash', readonly=True, copy=False,
+        help="Hash of the Shopify order fields last applied to this order "
+             "(status, cancellation and lines); updates with the same hash are skipped.")
+
+    def _shopify_confirm_paid_orders(self):
+        """Confirma, factura, cobra y concilia en lote órdenes ya pagadas en Shopify.
+
+        Cada paso se ejecuta sobre todo el recordset: una confirmación, una
+        facturación, un ``create`` de pagos y una conciliación para todas las
+        órdenes. Las facturas no se agrupan por cliente: cada orden de
+        Shopify tiene su propia factura, de la que dependen los reembolsos y
+        las ediciones de líneas.
+
+        Returns:
+            account.move: las facturas creadas
+        """
+        orders = self.filtered(lambda o: o.state in ('draft', 'sent'))
+        if not orders:
+            return self.env['account.move']
+        with stage('confirm'):
+            orders.action_confirm()
+        with stage('create_invoices'):
+            invoices = orders._create_invoices(grouped=True, final=True)
+        with stage('post_invoices'):
+            invoices.action_post()
+        with stage('register_payments'):
+            self._shopify_register_payments(invoices)
+        return invoices
+
+    @api.model
+    def _shopify_register_payments(self, invoices):
+        """Crea, publica y concilia un pago por factura, todo en lote.
+
+        Las notas de crédito (``out_refund``) reciben un pago saliente.
+        """
+        invoices = invoices.filtered(lambda inv: inv.amount_residual > 0)
+        if not invoices:
+            return self.env['account.payment']
+        journal = self.env['account.journal'].search(
+            [('code', '=', 'BNK1')], limit=1)
+        if not journal:
+            _logger.error("Bank Journal with code 'BNK1' not found!")
+            journal = self.env['account.journal'].search(
+                [('type', '=', 'bank')], limit=1)
+        payments = self.env['account.payment'].create([{
+            'amount': invoice.amount_residual,
+            'currency_id': invoice.currency_id.id,
+            'payment_type': 'outbound' if invoice.move_type == 'out_refund' else 'inbound',
+            'partner_type': 'customer',
+            'journal_id': journal.id,
+            'partner_id': invoice.commercial_partner_id.id,
+            'memo': f"Shopify {', '.join(invoice.invoice_line_ids.sale_line_ids.order_id.mapped('origin')) or invoice.name}",
+        } for invoice in invoices])
+        payments.action_post()
+
+        plan = []
+        for payment, invoice in zip(payments, invoices):
+            lines = (payment.move_id.line_ids + invoice.line_ids).filtered(
+                lambda line: line.account_id.account_type == 'asset_receivable' and not line.reconciled)
+            if len(lines) > 1:
+                plan.append(lines)
+        if plan:
+            self.env['account.move.line']._reconcile_plan(plan)
+        return payments
+
+
+class SaleOrderLine(models.Model):
+    _inherit = 'sale.order.line'
+
+    shopify_line_id = fields.Char(string='Shopify Line ID', readonly=True, copy=False)
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import time
+
+from odoo import api, fields, models
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+
+class ShopifyOrderImport(models.Model):
+    """Importación masiva de órdenes históricas desde un archivo JSONL de Shopify.
+
+    Cada línea del archivo es un objeto Order con el mismo esquema que recibe
+    el webhook ``orders/create``. El archivo se lee en streaming y se procesa
+    en bloques: clientes y productos se resuelven por bloque y las órdenes se
+    crean con un solo ``create`` multi-registro, confirmando la transacción al
+    final de cada bloque. La posición en el archivo se guarda con cada commit,
+    por lo que una importación interrumpida continúa donde quedó.
+    """
+    _name = 'shopify.order.import'
+    _description = 'Shopify Order Import'
+    _order = 'id desc'
+
+    name = fields.Char(string='Name', required=True)
+    file_path = fields.Char(
+        string='File Path', required=True,
+        help="Path on the server of the JSONL export, one Shopify order per line.")
+    shop = fields.Char(string='Shop Domain')
+    chunk_size = fields.Integer(string='Orders per Commit', default=500, required=True)
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='draft', required=True)
+    # Float con dígitos (columna numeric) y no Integer (int4): exportaciones
+    # de más de 2 GiB desbordarían la columna; numeric guarda el entero exacto.
+    byte_offset = fields.Float(string='File Position', default=0, digits=(20, 0), readonly=True)
+    file_size = fields.Float(string='File Size', digits=(20, 0), readonly=True)
+    lines_read = fields.Integer(string='Lines Read', default=0, readonly=True)
+    orders_created = fields.Integer(string='Orders Created', default=0, readonly=True)
+    orders_skipped = fields.Integer(string='Orders Skipped', default=0, readonly=True)
+    progress = fields.Float(string='Progress (%)', compute='_compute_progress')
+    last_error = fields.Text(string='Last Error', readonly=True)
+
+    @api.depends('byte_offset', 'file_size')
+    def _compute_progress(self):
+        for record in self:
+            record.progress = 100.0 * record.byte_offset / record.file_size if record.file_size else 0.0
+
+    def action_start(self):
+        for record in self:
+            if not os.path.isfile(record.file_path):
+                raise UserError(f"File {record.file_path} not found on the server")
+            record.write({
+                'state': 'running',
+                'file_size': os.path.getsize(record.file_path),
+                'last_error': False,
+            })
+        self.env.ref('shopifysteam.ir_cron_shopify_order_import')._trigger()
+
+    def action_reset(self):
+        self.write({
+            'state': 'draft',
+            'byte_offset': 0,
+            'lines_read': 0,
+            'orders_created': 0,
+            'orders_skipped': 0,
+            'last_error': False,
+        })
+
+    @api.model
+    def _cron_run_imports(self):
+        for record in self.search([('state', '=', 'running')], order='id'):
+            try:
+                record._run()
+            except Exception as e:
+                self.env.cr.rollback()
+                _logger.exception("Shopify import %s failed: %s", record.id, e)
+                record.write({'state': 'failed', 'last_error': str(e)})
+                self.env.cr.commit()
+
+    def _run(self):
+        """Lee el archivo desde ``byte_offset`` y procesa las órdenes bloque por bloque."""
+        self.ensure_one()
+        started = time.monotonic()
+        created_start = self.orders_created
+        with open(self.file_path, 'rb') as export:
+            export.seek(int(self.byte_offset))
+            while True:
+                chunk, lines, malformed = [], 0, 0
+                while len(chunk) < self.chunk_size:
+                    line = export.readline()
+                    if not line:
+                        break
+                    lines += 1
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        chunk.append(json.loads(line))
+                    except ValueError as e:
+                        # Una línea dañada no debe detener (ni bloquear al reanudar) la importación
+                        malformed += 1
+                        _logger.warning(
+                            "Shopify import %s: skipping malformed line %s: %s",
+                            self.id, self.lines_read + lines, e)
+                if not lines:
+                    break
+                created, skipped = self._import_chunk(chunk) if chunk else (0, 0)
+                self.write({
+                    'byte_offset': export.tell(),
+                    'lines_read': self.lines_read + lines,
+                    'orders_created': self.orders_created + created,
+                    'orders_skipped': self.orders_skipped + skipped + malformed,
+                })
+                self.env.cr.commit()
+                self.env.invalidate_all()
+                elapsed = time.monotonic() - started
+                _logger.info(
+                    "Shopify import %s: %.1f%% (%s created, %s skipped, %.0f orders/s)",
+                    self.id, self.progress, self.orders_created, self.orders_skipped,
+                    (self.orders_created - created_start) / elapsed if elapsed else 0.0)
+        self.state = 'done'
+        self.env.cr.commit()
+
+    def _import_chunk(self, orders):
+        """Crea las órdenes de un bloque que todavía no existen en Odoo.
+
+        Returns:
+            tuple: (órdenes creadas, órdenes omitidas)
+        """
+        Inbox = self.env['shopify.webhook.inbox'].new({'shop': self.shop or ''})
+        SyncMap = self.env['shopify.sync.map']
+        existing = SyncMap._lookup(self.shop, 'order', [data.get('id') for data in orders])
+        new_orders, seen = [], set()
+        for data in orders:
+            shopify_id = str(data.get('id') or '')
+            if not shopify_id or shopify_id in existing or shopify_id in seen \
+                    or data.get('financial_status') == 'voided':
+                continue
+            seen.add(shopify_id)
+            new_orders.append(data)
+        if not new_orders:
+            return 0, len(orders)
+
+        partner_ids = Inbox._get_or_create_partners(new_orders)
+        all_items = [item for data in new_orders for item in data.get('line_items', [])]
+        all_product_ids = Inbox._get_or_create_products(all_items)
+        Partner = self.env['res.partner'].browse(partner_ids)
+        vals_list, position = [], 0
+        for data, partner_id in zip(new_orders, partner_ids):
+            count = len(data.get('line_items', []))
+            vals_list.append(Inbox._prepare_order_vals(
+                data, Partner.browse(partner_id), all_product_ids[position:position + count]))
+            position += count
+        sale_orders = self.env['sale.order'].create(vals_list)
+        SyncMap._register(self.shop, 'order', {
+            data.get('id'): order.id for data, order in zip(new_orders, sale_orders)
+        })
+        # Mismo tratamiento de estados que el webhook (ver _process_order_payload)
+        sale_orders.browse([
+            order.id for data, order in zip(new_orders, sale_orders)
+            if data.get('financial_status') == 'paid'
+        ])._shopify_confirm_paid_orders()
+        sale_orders.browse([
+            order.id for data, order in zip(new_orders, sale_orders)
+            if data.get('financial_status') != 'paid' and Inbox._is_cancelled_in_shopify(data)
+        ]).with_context(disable_cancel_warning=True).action_cancel()
+        return len(sale_orders), len(orders) - len(sale_orders)
@@ -0,0 +1,87 @@
+from odoo import api, fields, models
+
+RESOURCE_MODELS = {
+    'order': 'sale.order',
+    'customer': 'res.partner',
+    'product': 'product.product',
+    'refund': 'account.move',
+}
+
+
+class ShopifySyncMap(models.Model):
+    """Relación entre un id de Shopify y el registro de Odoo que lo representa.
+
+    Reemplaza las búsquedas por texto (``client_order_ref``, ``ref``) con una
+    consulta puntual sobre el índice único (shop, resource_type, shopify_id).
+    Los registros migrados antes de conocer la tienda tienen ``shop`` vacío.
+    """
+    _name = 'shopify.sync.map'
+    _description = 'Shopify ID Mapping'
+
+    shop = fields.Char(string='Shop Domain', default='')
+    resource_type = fields.Selection([
+        ('order', 'Order'),
+        ('customer', 'Customer'),
+        ('product', 'Product Variant'),
+        ('refund', 'Refund'),
+    ], string='Resource Type', required=True)
+    shopify_id = fields.Char(string='Shopify ID', required=True)
+    res_model = fields.Char(string='Model', required=True)
+    res_id = fields.Many2oneReference(
+        string='Record ID', model_field='res_model', required=True)
+
+    _sql_constraints = [
+        ('unique_shopify_resource', 'UNIQUE(shop, resource_type, shopify_id)',
+         'A Shopify resource can only be mapped once per shop!')
+    ]
+
+    @api.model
+    def _lookup(self, shop, resource_type, shopify_ids):
+        """Devuelve los registros de Odoo ya asociados a los ids de Shopify dados.
+
+        Returns:
+            dict: ``{shopify_id: record id}``
+        """
+        shopify_ids = [str(sid) for sid in shopify_ids if sid]
+        if not shopify_ids:
+            return {}
+        shops = list({shop or '', ''})
+        mappings = self.sudo().search_fetch([
+            ('shop', 'in', shops),
+            ('resource_type', '=', resource_type),
+            ('shopify_id', 'in', shopify_ids),
+        ], ['shopify_id', 'res_id'])
+        return {m.shopify_id: m.res_id for m in mappings}
+
+    @api.model
+    def _lookup_record(self, shop, resource_type, shopify_id):
+        """Devuelve el registro asociado a un id de Shopify, o un recordset vacío."""
+        Model = self.env[RESOURCE_MODELS[resource_type]]
+        res_id = self._lookup(shop, resource_type, [shopify_id]).get(str(shopify_id))
+        return Model.browse(res_id).exists() if res_id else Model
+
+    @api.model
+    def _register(self, shop, resource_type, mapping):
+        """Registra ``{shopify_id: record id}`` para los ids que aún no tienen relación."""
+        mapping = {str(sid): res_id for sid, res_id in mapping.items() if sid}
+        existing = self._lookup(shop, resource_type, list(mapping))
+        vals_list = [{
+            'shop': shop or '',
+            'resource_type': resource_type,
+            'shopify_id': sid,
+            'res_model': RESOURCE_MODELS[resource_type],
+            'res_id': res_id,
+        } for sid, res_id in mapping.items() if sid not in existing]
+        return self.sudo().create(vals_list)
+
+    @api.model
+    def _unregister(self, shop, resource_type, shopify_ids):
+        """Elimina las relaciones de los ids dados, p. ej. cuando el registro de Odoo ya no existe."""
+        shopify_ids = [str(sid) for sid in shopify_ids if sid]
+        if not shopify_ids:
+            return
+        self.sudo().search([
+            ('shop', 'in', list({shop or '', ''})),
+            ('resource_type', '=', resource_type),
+            ('shopify_id', 'in', shopify_ids),
+        ]).unlink()
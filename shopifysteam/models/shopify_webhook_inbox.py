@@ -0,0 +1,813 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+
+import pytz
+from odoo import api, fields, models
+from odoo.exceptions import UserError
+from odoo.tools import SQL, email_normalize, ormcache
+
+from .res_partner import DEFAULT_PHONE_COUNTRY_CODE, normalize_phone
+from .webhook_metrics import WebhookTimer, stage
+
+_logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 60  # segundos
+RETRY_MAX_DELAY = 3600  # segundos
+LOCKED_RETRY_DELAY = 10  # segundos
+
+ORDER_UPDATE_TOPICS = ('orders/updated', 'orders/paid')
+SUPPORTED_TOPICS = ('orders/create', 'refunds/create') + ORDER_UPDATE_TOPICS
+
+
+class ShopifyWebhookInbox(models.Model):
+    """Bandeja persistente de webhooks de Shopify.
+
+    El controlador solo valida el HMAC y guarda el cuerpo recibido; el cron
+    ``ir_cron_shopify_webhook_inbox`` procesa los registros pendientes en
+    segundo plano, con reintentos y espera exponencial. Una copia comprimida
+    del cuerpo queda en ``webhook.payload.archive`` y ``payload`` se vacía
+    cuando el webhook se procesa con éxito.
+    """
+    _name = 'shopify.webhook.inbox'
+    _description = 'Shopify Webhook Inbox'
+    _order = 'id desc'
+
+    name = fields.Char(string='Order Name', readonly=True)
+    shop = fields.Char(string='Shop Domain', readonly=True)
+    webhook_id = fields.Char(string='Webhook ID', readonly=True,
+                             help="Value of the X-Shopify-Webhook-Id header.")
+    topic = fields.Char(string='Topic', required=True,
+                        default='orders/create', readonly=True)
+    shopify_id = fields.Char(string='Shopify ID', index=True, readonly=True)
+    payload = fields.Text(string='Payload', readonly=True)
+    archive_id = fields.Many2one(
+        'webhook.payload.archive', string='Archived Payload',
+        ondelete='set null', index=True, readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='pending', required=True, index=True)
+    attempts = fields.Integer(string='Attempts', default=0, readonly=True)
+    next_attempt_at = fields.Datetime(
+        string='Next Attempt', default=fields.Datetime.now, index=True)
+    processed_at = fields.Datetime(string='Processed At', readonly=True)
+    result_message = fields.Char(string='Result', readonly=True)
+    last_error = fields.Text(string='Last Error', readonly=True)
+    sale_order_id = fields.Many2one(
+        'sale.order', string='Sale Order', ondelete='set null', readonly=True)
+
+    _sql_constraints = [
+        ('unique_webhook_id', 'UNIQUE(webhook_id)',
+         'A Shopify webhook delivery can only be queued once!')
+    ]
+
+    @api.model
+    def _enqueue(self, data, raw_payload, shop=None, webhook_id=None, topic='orders/create'):
+        """Guarda un webhook recibido y despierta al cron que procesa la bandeja.
+
+        La entrega se reclama con ``INSERT ... ON CONFLICT (webhook_id) DO
+        NOTHING``: un reintento de Shopify, o un segundo ``orders/create``
+        para la misma orden, devuelve el registro original en lugar de encolar
+        otro. Una actualización que no cambia nada de lo que Odoo refleja
+        (ver ``_order_state_hash``) no se encola.
+
+        Para ``refunds/create`` el campo ``shopify_id`` guarda la orden
+        reembolsada, de modo que el bloqueo por orden también lo cubre.
+
+        Returns:
+            tuple: (registro de la bandeja, True si se acaba de encolar); el
+            registro está vacío cuando la actualización se descartó.
+        """
+        shop = shop or ''
+        topic = topic or 'orders/create'
+        if topic == 'refunds/create':
+            shopify_id = str(data.get('order_id') or '')
+            external_id = str(data.get('id') or '')
+            name = f"Refund {external_id}"
+        else:
+            shopify_id = external_id = str(data.get('id') or '')
+            name = data.get('name')
+        if topic in ORDER_UPDATE_TOPICS and self._is_order_unchanged(shop, data):
+            return self.browse(), False
+        if shopify_id and topic == 'orders/create':
+            duplicate = self.search([
+                ('shopify_id', '=', shopify_id),
+                ('shop', '=', shop),
+                ('topic', '=', 'orders/create'),
+                ('state', '!=', 'failed'),
+            ], limit=1)
+            if duplicate:
+                return duplicate, False
+        now = fields.Datetime.now()
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO shopify_webhook_inbox
+                   (webhook_id, name, shop, topic, shopify_id, payload, state,
+                    attempts, next_attempt_at,
+                    create_uid, create_date, write_uid, write_date)
+            VALUES (%s, %s, %s, %s, %s, %s, 'pending', 0, %s, %s, %s, %s, %s)
+            ON CONFLICT (webhook_id) DO NOTHING
+            RETURNING id
+            """,
+            webhook_id or None, name, shop, topic, shopify_id, raw_payload,
+            now, self.env.uid, now, self.env.uid, now,
+        ))
+        row = self.env.cr.fetchone()
+        if not row:
+            return self.search([('webhook_id', '=', webhook_id)], limit=1), False
+        item = self.browse(row[0])
+        item.archive_id = self.env['webhook.payload.archive']._archive(
+            'shopify', external_id, raw_payload, topic=topic)
+        self.env.ref('shopifysteam.ir_cron_shopify_webhook_inbox')._trigger()
+        return item, True
+
+    def action_retry(self):
+        self.write({
+            'state': 'pending',
+            'next_attempt_at': fields.Datetime.now(),
+        })
+        self.env.ref('shopifysteam.ir_cron_shopify_webhook_inbox')._trigger()
+
+    @api.model
+    def _cron_process_inbox(self, batch_size=50):
+        """Procesa hasta ``batch_size`` webhooks pendientes, uno por transacción.
+
+        Cada registro se bloquea con ``FOR UPDATE SKIP LOCKED`` para que dos
+        ejecuciones simultáneas nunca tomen el mismo webhook.
+        """
+        for _i in range(batch_size):
+            self.env.cr.execute(SQL(
+                """
+                SELECT id FROM shopify_webhook_inbox
+                 WHERE state = 'pending'
+                   AND next_attempt_at <= %s
+              ORDER BY id
+                 LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+                """,
+                fields.Datetime.now(),
+            ))
+            row = self.env.cr.fetchone()
+            if not row:
+                return
+            self.browse(row[0])._process()
+            self.env.cr.commit()
+        # Quedan pendientes: volver a ejecutar el cron en cuanto sea posible
+        self.env.ref('shopifysteam.ir_cron_shopify_webhook_inbox')._trigger()
+
+    def _process(self):
+        self.ensure_one()
+        if not self._try_lock_order():
+            # Otra transacción está procesando la misma orden: reintentar luego
+            # sin contar el intento.
+            self.next_attempt_at = fields.Datetime.now() + timedelta(seconds=LOCKED_RETRY_DELAY)
+            return
+        try:
+            with WebhookTimer('shopify_inbox', self.env), self.env.cr.savepoint():
+                with stage('parse'):
+                    data = json.loads(self.payload)
+                message, order = self._process_payload(data)
+        except Exception as e:
+            _logger.exception("Shopify Sync Error (inbox %s): %s", self.id, e)
+            self._schedule_retry(str(e))
+            return
+        vals = {
+            'state': 'done',
+            'processed_at': fields.Datetime.now(),
+            'result_message': message,
+            'sale_order_id': order.id if order else False,
+            'last_error': False,
+        }
+        if self.archive_id:
+            # El cuerpo ya está en webhook.payload.archive
+            vals['payload'] = False
+        self.write(vals)
+
+    def _try_lock_order(self):
+        """Toma un advisory lock de transacción para la orden de Shopify de este registro."""
+        if not self.shopify_id:
+            return True
+        self.env.cr.execute(SQL(
+            "SELECT pg_try_advisory_xact_lock(hashtext(%s))",
+            f"shopify.order:{self.shop or ''}:{self.shopify_id}",
+        ))
+        return self.env.cr.fetchone()[0]
+
+    def _schedule_retry(self, error):
+        attempts = self.attempts + 1
+        if attempts >= MAX_ATTEMPTS:
+            self.write({
+                'state': 'failed',
+                'attempts': attempts,
+                'last_error': error,
+            })
+            return
+        delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+        self.write({
+            'attempts': attempts,
+            'last_error': error,
+            'next_attempt_at': fields.Datetime.now() + timedelta(seconds=delay),
+        })
+
+    def _process_payload(self, data):
+        if self.topic == 'refunds/create':
+            return self._process_refund_payload(data)
+        if self.topic in ORDER_UPDATE_TOPICS:
+            return self._process_order_update(data)
+        return self._process_order_payload(data)
+
+    def _process_order_payload(self, data):
+        """Toma el objeto Order enviado por Shopify y lo convierte en una orden en Odoo.
+
+        Returns:
+            tuple: (mensaje de resultado, sale.order creada o None)
+        """
+        env = self.env
+        SyncMap = env['shopify.sync.map']
+        with stage('lookup_order'):
+            existing_order = SyncMap._lookup_record(
+                self.shop, 'order', data.get('id'))
+        if existing_order:
+            return "Order already exists", existing_order
+
+        with stage('partners'):
+            partner_id = self._get_or_create_partners([data])[0]
+        line_items = data.get('line_items', [])
+        with stage('products'):
+            product_ids = self._get_or_create_products(line_items)
+        with stage('order_create'):
+            new_order = env['sale.order'].create(self._prepare_order_vals(
+                data, env['res.partner'].browse(partner_id), product_ids))
+            SyncMap._register(self.shop, 'order', {data.get('id'): new_order.id})
+        shopify_status = data.get('financial_status')
+
+        if shopify_status == 'paid':
+            new_order._shopify_confirm_paid_orders()
+            return "Order Created and Paid", new_order
+        elif self._is_cancelled_in_shopify(data):
+            new_order.with_context(disable_cancel_warning=True).action_cancel()
+            return "Order Created and Cancelled", new_order
+
+        with stage('confirm'):
+            new_order.action_confirm()
+        with stage('create_invoices'):
+            invoice = new_order._create_invoices(final=True)
+        with stage('post_invoices'):
+            invoice.action_post()
+        merchant_id = new_order.company_id.mercantil_merchant_id
+        if not merchant_id:
+            _logger.error(
+                "Mercantil Merchant ID not configured for company %s", new_order.company_id.name)
+            return "Merchant ID missing", new_order
+        with stage('mercantil_link'):
+            pago = env['sale.order.pago.mercantil'].create({
+                'order_id': new_order.id,
+                'merchant_id': merchant_id,
+                'return_url': "https://megalabs.steamsolutions.tech/payment/processing",
+                'invoice_number': new_order.client_order_ref or new_order.name,
+                'invoice_creation_date': new_order.date_order.date() if new_order.date_order else fields.Date.today(),
+                'invoice_cancelled_date': new_order.date_order.date() if new_order.date_order else fields.Date.today(),
+                'contract_number': new_order.id,
+                'contract_date': new_order.date_order.date() if new_order.date_order else fields.Date.today(),
+                'trx_type': 'compra'
+            })
+            try:
+                with env.cr.savepoint():
+                    pago.generate_link_payment()
+            except Exception as e:
+                # El enlace se vuelve a generar en /payment/redirect
+                _logger.warning("Could not pre-generate Mercantil link for %s: %s", new_order.name, e)
+        with stage('send_email'):
+            self._send_new_order_email(new_order)
+        return "Order Draft Created, Link Sent", new_order
+
+    def _prepare_order_vals(self, data, partner, product_ids):
+        """Valores de creación de la sale.order para un objeto Order de Shopify.
+
+        Args:
+            data (dict): Objeto Order de Shopify.
+            partner (res.partner): Cliente ya resuelto.
+            product_ids (list): ids de product.product alineados con ``line_items``.
+        """
+        order_lines = [
+            fields.Command.create(self._prepare_order_line_vals(item, product_id))
+            for item, product_id in zip(data.get('line_items', []), product_ids)
+            if self._line_quantity(item)
+        ]
+
+        created_at = data.get('created_at')
+        if not created_at:
+            order_date = fields.Datetime.now()
+        else:
+            dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+            order_date = dt.astimezone(pytz.utc).replace(tzinfo=None)
+        shipping_data = data.get('shipping_lines', [])
+        shipping_name = shipping_data[0].get(
+            'title') if shipping_data else 'No Shipping'
+        default_dm, default_pm = self._get_default_method_ids()
+        delivery_method_id = self.env['sale.delivery.method']._get_id_by_name(
+            shipping_name.strip().lower().replace(' ', '_'))
+        billing_data = self._get_billing_address(data)
+        note_content = (
+            f"--- INFORMACIÓN DE DESPACHO ---\n"
+            f"Método de Envío: {default_dm}\n"
+            f"Pasarela de Pago: {default_pm}\n\n"
+            f"--- DIRECCIÓN DE FACTURACIÓN ---\n"
+            f"{partner.name}\n"
+            f"{billing_data.get('street')}, {billing_data.get('street2') or ''}\n"
+            f"{billing_data.get('city')}, {billing_data.get('province') or ''} {billing_data.get('zip') or ''}\n"
+            f"Tel: {billing_data.get('phone') or partner.phone or 'N/A'}\n\n"
+            f"--- NOTAS ADICIONALES ---\n"
+            f"Por favor, si su pago es por transferencia o Pago Móvil, "
+            f"envíe el comprobante al correo de contacto."
+        )
+        return {
+            'partner_id': partner.id,
+            'origin': data.get('name'),  # e.g. #9999
+            'client_order_ref': str(data.get('id')),  # Shopify Internal ID
+            'order_line': order_lines,
+            'date_order': order_date,
+            'company_id': self.env.company.id,
+            'delivery_method_id': delivery_method_id or default_dm,
+            'note': note_content,
+            'shopify_state_hash': self._order_state_hash(data),
+        }
+
+    @api.model
+    def _prepare_order_line_vals(self, item, product_id):
+        return {
+            'product_id': product_id,
+            'product_uom_qty': self._line_quantity(item),
+            'price_unit': float(item.get('price', 0.0)),
+            'name': item.get('title'),
+            'shopify_line_id': str(item['id']) if item.get('id') else False,
+        }
+
+    @api.model
+    def _line_quantity(self, item):
+        """Cantidad vigente de la línea: ``current_quantity`` descuenta ediciones y eliminaciones."""
+        return item.get('current_quantity', item.get('quantity')) or 0
+
+    @api.model
+    def _order_state_hash(self, data):
+        """Hash de lo que Odoo refleja de una orden: estado financiero, cancelación y líneas.
+
+        Los cambios que Shopify notifica pero que no afectan a la orden en
+        Odoo (etiquetas, notas, fulfillment...) producen el mismo hash.
+        """
+        lines = sorted(
+            [str(item.get('id')), str(item.get('variant_id')), self._line_quantity(item), str(item.get('price'))]
+            for item in data.get('line_items', []))
+        state = {
+            'financial_status': data.get('financial_status'),
+            'cancelled_at': data.get('cancelled_at'),
+            'lines': lines,
+        }
+        return hashlib.sha256(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+    @api.model
+    def _is_cancelled_in_shopify(self, data):
+        """True si la orden llega anulada, reembolsada o cancelada desde Shopify."""
+        return data.get('financial_status') in ('voided', 'refunded') or bool(data.get('cancelled_at'))
+
+    def _is_order_unchanged(self, shop, data):
+        """True si la orden ya existe y su ``shopify_state_hash`` coincide con el payload."""
+        order_id = self.env['shopify.sync.map']._lookup(
+            shop, 'order', [data.get('id')]).get(str(data.get('id')))
+        if not order_id:
+            return False
+        order = self.env['sale.order'].search_fetch(
+            [('id', '=', order_id)], ['shopify_state_hash'])
+        return bool(order) and order.shopify_state_hash == self._order_state_hash(data)
+
+    def _process_order_update(self, data):
+        """Aplica a la orden existente solo lo que cambió en Shopify.
+
+        Sirve para ``orders/updated`` y ``orders/paid``, que envían el objeto
+        Order completo. Si el hash del payload coincide con el de la orden no
+        se escribe nada; si no, se aplican en orden la cancelación, las
+        líneas modificadas y el pago.
+
+        Returns:
+            tuple: (mensaje de resultado, sale.order)
+        """
+        with stage('lookup_order'):
+            order = self.env['shopify.sync.map']._lookup_record(
+                self.shop, 'order', data.get('id'))
+        if not order:
+            # La actualización llegó antes que la creación: el payload es la orden completa
+            return self._process_order_payload(data)
+        state_hash = self._order_state_hash(data)
+        if order.shopify_state_hash == state_hash:
+            return "No changes", order
+        if order.state == 'cancel':
+            order.shopify_state_hash = state_hash
+            return "Order is cancelled, update ignored", order
+
+        financial_status = data.get('financial_status')
+        changes = []
+        if data.get('cancelled_at') or financial_status == 'voided':
+            with stage('cancel'):
+                changes.append(self._cancel_shopify_order(order))
+        else:
+            # Las líneas reembolsadas las ajusta refunds/create
+            if financial_status not in ('refunded', 'partially_refunded'):
+                with stage('lines'):
+                    changes.append(self._apply_line_changes(order, data))
+            if financial_status == 'paid':
+                with stage('payment'):
+                    changes.append(self._apply_shopify_payment(order))
+        order.shopify_state_hash = state_hash
+        changes = [change for change in changes if change]
+        return f"Order updated: {', '.join(changes)}" if changes else "No changes", order
+
+    @api.model
+    def _get_order_invoices(self, order, paid=False):
+        """Facturas de cliente publicadas de la orden: con pagos si ``paid``, si no las pendientes."""
+        payment_states = ('paid', 'in_payment', 'partial') if paid else ('not_paid',)
+        return order.invoice_ids.filtered(
+            lambda inv: inv.move_type == 'out_invoice' and inv.state == 'posted'
+            and inv.payment_state in payment_states)
+
+    def _cancel_shopify_order(self, order):
+        if self._get_order_invoices(order, paid=True):
+            _logger.warning(
+                "Shopify order %s was cancelled after payment; refund must be reviewed", order.name)
+            return "cancelled in Shopify after payment, review refund"
+        open_invoices = self._get_order_invoices(order)
+        if open_invoices:
+            open_invoices.button_draft()
+            open_invoices.button_cancel()
+        order.with_context(disable_cancel_warning=True).action_cancel()
+        return "cancelled"
+
+    def _apply_line_changes(self, order, data):
+        """Actualiza, agrega o pone en cero las líneas que cambiaron en Shopify.
+
+        Las líneas se asocian por ``shopify_line_id``; las órdenes creadas
+        antes de guardar ese id se asocian por producto. Si la orden tiene
+        una factura pendiente, se cancela y se vuelve a facturar con las
+        líneas nuevas; si ya está pagada, el cambio no se aplica.
+        """
+        items = data.get('line_items', [])
+        product_ids = self._get_or_create_products(items)
+        lines = order.order_line.filtered(lambda line: not line.display_type)
+        lines_by_id = {line.shopify_line_id: line for line in lines if line.shopify_line_id}
+        unmatched = lines.filtered(lambda line: not line.shopify_line_id)
+        commands, matched, changed = [], set(), False
+        for item, product_id in zip(items, product_ids):
+            line_id = str(item.get('id') or '')
+            quantity = self._line_quantity(item)
+            price = float(item.get('price', 0.0))
+            line = lines_by_id.get(line_id)
+            if not line:
+                line = unmatched.filtered(lambda l: l.product_id.id == product_id)[:1]
+                unmatched -= line
+            if not line:
+                if quantity:
+                    commands.append(fields.Command.create(
+                        self._prepare_order_line_vals(item, product_id)))
+                    changed = True
+                continue
+            matched.add(line.id)
+            vals = {}
+            if line.product_uom_qty != quantity:
+                vals['product_uom_qty'] = quantity
+            if order.currency_id.compare_amounts(line.price_unit, price):
+                vals['price_unit'] = price
+            changed = changed or bool(vals)
+            if not line.shopify_line_id and line_id:
+                vals['shopify_line_id'] = line_id
+            if vals:
+                commands.append(fields.Command.update(line.id, vals))
+        for line in lines.filtered(lambda l: l.shopify_line_id and l.id not in matched and l.product_uom_qty):
+            commands.append(fields.Command.update(line.id, {'product_uom_qty': 0}))
+            changed = True
+        if not changed:
+            if commands:
+                order.write({'order_line': commands})
+            return None
+        if self._get_order_invoices(order, paid=True):
+            _logger.warning(
+                "Shopify order %s changed after payment; lines were not updated", order.name)
+            return "lines changed after payment, review manually"
+        open_invoices = self._get_order_invoices(order)
+        if open_invoices:
+            open_invoices.button_draft()
+            open_invoices.button_cancel()
+        order.write({'order_line': commands})
+        if open_invoices:
+            invoices = order._create_invoices(final=True)
+            invoices.action_post()
+        return "lines"
+
+    def _apply_shopify_payment(self, order):
+        if order.state in ('draft', 'sent'):
+            order._shopify_confirm_paid_orders()
+            return "paid"
+        invoices = self._get_order_invoices(order)
+        if not invoices and order.invoice_status == 'to invoice':
+            invoices = order._create_invoices(final=True)
+            invoices.action_post()
+        if not invoices:
+            return None
+        order._shopify_register_payments(invoices)
+        return "paid"
+
+    def _process_refund_payload(self, data):
+        """Registra un objeto Refund de Shopify como nota de crédito de la orden.
+
+        Las cantidades reembolsadas se descuentan de las líneas de la orden y
+        la nota de crédito se genera con ``_create_invoices``. Cada reembolso
+        se registra en ``shopify.sync.map``, por lo que una segunda entrega no
+        crea otra nota. Si la orden todavía no existe en Odoo se lanza un
+        error para que la bandeja lo reintente más tarde.
+
+        Returns:
+            tuple: (mensaje de resultado, sale.order)
+        """
+        SyncMap = self.env['shopify.sync.map']
+        refund_id = str(data.get('id') or '')
+        with stage('lookup_order'):
+            order = SyncMap._lookup_record(self.shop, 'order', data.get('order_id'))
+        if not order:
+            raise UserError(
+                f"Shopify order {data.get('order_id')} not found for refund {refund_id}")
+        if SyncMap._lookup(self.shop, 'refund', [refund_id]):
+            return "Refund already registered", order
+
+        lines_by_id = {line.shopify_line_id: line for line in order.order_line if line.shopify_line_id}
+        commands = []
+        for refund_line in data.get('refund_line_items', []):
+            line = lines_by_id.get(str(refund_line.get('line_item_id')))
+            quantity = refund_line.get('quantity') or 0
+            if line and quantity:
+                commands.append(fields.Command.update(line.id, {
+                    'product_uom_qty': max(line.product_uom_qty - quantity, 0),
+                }))
+        if not commands:
+            return "Refund without line items, review manually", order
+        with stage('refund_lines'):
+            order.write({'order_line': commands})
+        if order.state != 'sale':
+            return "Refund applied to order lines", order
+        with stage('credit_note'):
+            credit_notes = order._create_invoices(final=True).filtered(
+                lambda move: move.move_type == 'out_refund')
+            credit_notes.action_post()
+        if not credit_notes:
+            return "Refund applied to order lines", order
+        SyncMap._register(self.shop, 'refund', {refund_id: credit_notes[:1].id})
+
+        with stage('refund_payment'):
+            refunded = any(
+                transaction.get('kind') == 'refund' and transaction.get('status') == 'success'
+                for transaction in data.get('transactions', []))
+            if refunded:
+                order._shopify_register_payments(credit_notes)
+            else:
+                # Sin devolución de dinero la nota de crédito rebaja la factura pendiente
+                receivables = (credit_notes.line_ids + self._get_order_invoices(order).line_ids).filtered(
+                    lambda line: line.account_id.account_type == 'asset_receivable' and not line.reconciled)
+                if len(receivables) > 1:
+                    receivables.reconcile()
+        return "Refund registered as credit note", order
+
+    @api.model
+    @ormcache()
+    def _get_shopify_secret(self):
+        """Clave ``shopify.api_secret`` ya codificada para el cálculo del HMAC.
+
+        La caché se invalida cuando cambia cualquier ir.config_parameter.
+        """
+        secret = self.env['ir.config_parameter'].sudo().get_param(
+            'shopify.api_secret')
+        return secret.encode('utf-8') if secret else b''
+
+    @api.model
+    @ormcache()
+    def _get_default_method_ids(self):
+        """Ids del método de envío y de pago por defecto: (dm_standard, pm_mobile_payment)."""
+        return (
+            self.env.ref('shopifysteam.dm_standard').id,
+            self.env.ref('shopifysteam.pm_mobile_payment').id,
+        )
+
+    def _get_billing_address(self, data):
+        billing = data.get("billing_address") or {}
+        country_id, state_id = self.env['res.country']._resolve_country_state(
+            billing.get('country_code'), billing.get('province'))
+        return {
+            'street': billing.get('address1'),
+            'street2': billing.get('address2'),
+            'city': billing.get('city'),
+            'zip': billing.get('zip'),
+            'state_id': state_id,
+            'country_id': country_id,
+            'phone': billing.get('phone'),
+        }
+
+    def _get_or_create_partners(self, orders):
+        """Resuelve los clientes de varias órdenes de Shopify con consultas en lote.
+
+        El orden de prioridad es ``shopify.sync.map``, ``ref`` (id de cliente
+        de Shopify), email normalizado y teléfono E.164; las tres últimas
+        claves se buscan en una sola consulta sobre columnas indexadas. Los
+        que faltan se crean con un solo ``create`` multi-registro, sin
+        duplicar a un invitado que aparece varias veces en el lote.
+
+        Returns:
+            list: ids de res.partner, en el mismo orden que ``orders``
+        """
+        Partner = self.env['res.partner']
+        SyncMap = self.env['shopify.sync.map']
+        customers = [data.get('customer') or {} for data in orders]
+        mapped = SyncMap._lookup(
+            self.shop, 'customer', [cust.get('id') for cust in customers])
+        valid_ids = set(Partner.browse(set(mapped.values())).exists().ids)
+        mapped = {cid: pid for cid, pid in mapped.items() if pid in valid_ids}
+
+        candidates = []
+        for data, cust in zip(orders, customers):
+            cust_id = str(cust.get('id') or '')
+            candidates.append({
+                'ref': cust_id,
+                'email': email_normalize(cust.get('email') or data.get('email')) or False,
+                'phone': self._get_customer_phone_key(cust, data),
+            })
+        pending = [cand for cand in candidates if cand['ref'] not in mapped]
+        found = {'ref': {}, 'email': {}, 'phone': {}}
+        refs = {cand['ref'] for cand in pending if cand['ref']}
+        emails = {cand['email'] for cand in pending if cand['email']}
+        phones = {cand['phone'] for cand in pending if cand['phone']}
+        if refs or emails or phones:
+            domain = ['|', '|',
+                      ('ref', 'in', list(refs)),
+                      ('email_normalized', 'in', list(emails)),
+                      ('shopify_phone_key', 'in', list(phones))]
+            for partner in Partner.search_fetch(
+                    domain, ['ref', 'email_normalized', 'shopify_phone_key'], order='id'):
+                found['ref'].setdefault(partner.ref, partner.id)
+                found['email'].setdefault(partner.email_normalized, partner.id)
+                found['phone'].setdefault(partner.shopify_phone_key, partner.id)
+
+        keys, to_create, new_keys = [], {}, {}
+        for data, cust, cand in zip(orders, customers, candidates):
+            if cand['ref'] in mapped:
+                keys.append(('id', mapped[cand['ref']]))
+                continue
+            partner_id = next((found[field][cand[field]] for field in ('ref', 'email', 'phone')
+                               if cand[field] and cand[field] in found[field]), None)
+            if partner_id:
+                keys.append(('id', partner_id))
+                continue
+            # Un invitado repetido en el lote reutiliza el contacto por crear
+            key = next((new_keys[field, cand[field]] for field in ('ref', 'email', 'phone')
+                        if cand[field] and (field, cand[field]) in new_keys), None)
+            if key is None:
+                key = len(to_create)
+                to_create[key] = self._prepare_partner_vals(cust, data)
+                for field in ('ref', 'email', 'phone'):
+                    if cand[field]:
+                        new_keys.setdefault((field, cand[field]), key)
+            keys.append(('new', key))
+
+        new_ids = dict(zip(to_create, Partner.create(list(to_create.values())).ids)) if to_create else {}
+        partner_ids = [value if kind == 'id' else new_ids[value] for kind, value in keys]
+        SyncMap._register(self.shop, 'customer', {
+            cust.get('id'): pid for cust, pid in zip(customers, partner_ids)
+            if cust.get('id') and str(cust['id']) not in mapped
+        })
+        return partner_ids
+
+    @api.model
+    def _get_customer_phone(self, shopify_cust, data):
+        shipping = data.get("shipping_address")
+        phone = shipping.get("phone") if shipping else shopify_cust.get(
+            'billing_address', {}).get('phone')
+        return phone or shopify_cust.get('phone') or data.get('phone')
+
+    def _get_customer_phone_key(self, shopify_cust, data):
+        """Teléfono E.164 del cliente, normalizado con el país de facturación.
+
+        Son el mismo teléfono y país que recibe el contacto al crearse (ver
+        ``_prepare_partner_vals``), de modo que la clave coincide con
+        ``res.partner.shopify_phone_key``.
+        """
+        phone = self._get_customer_phone(shopify_cust, data)
+        phone_code = False
+        if data.get('billing_address'):
+            billing_data = self._get_billing_address(data)
+            phone = billing_data['phone'] or phone
+            if billing_data['country_id']:
+                phone_code = self.env['res.country'].browse(billing_data['country_id']).phone_code
+        return normalize_phone(phone, phone_code or DEFAULT_PHONE_COUNTRY_CODE)
+
+    def _prepare_partner_vals(self, shopify_cust, data):
+        phone = self._get_customer_phone(shopify_cust, data)
+        vals = {
+            'name': f"{shopify_cust.get('first_name') or ''} {shopify_cust.get('last_name') or ''}".strip()
+            or (data.get('billing_address') or {}).get('name') or shopify_cust.get('email') or data.get('email'),
+            'email': shopify_cust.get('email') or data.get('email'),
+            'phone': phone,
+            'ref': str(shopify_cust['id']) if shopify_cust.get('id') else False,
+        }
+        if data.get('billing_address'):
+            billing_data = self._get_billing_address(data)
+            # optional: preserve billing phone
+            billing_data['phone'] = billing_data['phone'] or phone
+            vals.update(billing_data)
+        return vals
+
+    @api.model
+    def _product_key(self, item):
+        """Clave con la que se agrupan las líneas: el SKU, o el título si no tiene."""
+        return item.get('sku') or ('title', item.get('title'))
+
+    def _get_or_create_products(self, line_items):
+        """Resuelve los productos de todo el carrito en una sola búsqueda.
+
+        Las variantes ya conocidas se resuelven por ``shopify.sync.map``
+        (las relaciones a productos borrados se descartan y se vuelven a
+        resolver); el resto de los SKU se buscan con un único ``default_code IN (...)`` y los
+        que no existen se crean con un solo ``create`` multi-registro, de modo
+        que el número de consultas no depende de la cantidad de líneas.
+
+        Returns:
+            list: ids de product.product, en el mismo orden que ``line_items``
+        """
+        Product = self.env['product.product']
+        SyncMap = self.env['shopify.sync.map']
+        variants = SyncMap._lookup(
+            self.shop, 'product', [item.get('variant_id') for item in line_items])
+        # res_id no tiene clave foránea: un producto borrado deja la relación huérfana
+        valid_ids = set(Product.browse(set(variants.values())).exists().ids)
+        stale = [sid for sid, pid in variants.items() if pid not in valid_ids]
+        if stale:
+            SyncMap._unregister(self.shop, 'product', stale)
+            variants = {sid: pid for sid, pid in variants.items() if pid in valid_ids}
+        pending = [item for item in line_items
+                   if str(item.get('variant_id')) not in variants]
+        skus = {item['sku'] for item in pending if item.get('sku')}
+        products = {}
+        if skus:
+            for product in Product.search_fetch(
+                    [('default_code', 'in', list(skus))], ['default_code']):
+                products.setdefault(product.default_code, product.id)
+
+        to_create = {}
+        for item in pending:
+            key = self._product_key(item)
+            if key not in products and key not in to_create:
+                to_create[key] = {
+                    'name': item.get('title'),
+                    'default_code': item.get('sku') or False,
+                    'list_price': float(item.get('price', 0.0)),
+                    'type': 'consu',
+                }
+        if to_create:
+            new_products = Product.create(list(to_create.values()))
+            products.update(zip(to_create, new_products.ids))
+
+        new_variants = {item.get('variant_id'): products[self._product_key(item)]
+                        for item in pending if item.get('variant_id')}
+        if new_variants:
+            SyncMap._register(self.shop, 'product', new_variants)
+            variants.update({str(k): v for k, v in new_variants.items()})
+        return [variants.get(str(item.get('variant_id'))) or products[self._product_key(item)]
+                for item in line_items]
+
+    def _send_new_order_email(self, sale_order):
+        """
+        Calculates the VES total and latest rate to send in the email.
+
+        The email is rendered right away, so the rate and VES total are frozen
+        in the queued mail.mail, and delivery is left to the mail queue cron,
+        which sends queued mails in batches over one SMTP connection.
+        """
+        template = self.env.ref('shopifysteam.new_sale_order_emailv1').sudo()
+        base_url = self.env['ir.config_parameter'].sudo(
+        ).get_param('web.base.url')
+        dynamic_link = f"{base_url}/payment/redirect/{sale_order.id}"
+
+        current_rate = self.env['steamtasabcv.exchange.rate'].get_current_rate(
+            self.env.ref('base.VES'), sale_order.company_id) or 1.0
+        total_ves = sale_order.amount_total * current_rate
+        _logger.info(
+            f"Sending email for {sale_order.name} - Rate: {current_rate} - Total VES: {total_ves}")
+
+        template.with_context(
+            custom_link=dynamic_link,
+            current_bcv_rate=current_rate,
+            total_in_ves=total_ves,
+            special_note='',
+            tracking_number='TRK-%s' % sale_order.name,
+            default_email_from="megalabs@steamsolutions.tech"
+        ).sudo().send_mail(sale_order.id, force_send=False)
+        self.env.ref('mail.ir_cron_mail_scheduler_action')._trigger()
+
+        return True
@@ -0,0 +1,169 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_logger = logging.getLogger(__name__)
+
+SLOW_WEBHOOK_PARAM = 'shopifysteam.slow_webhook_ms'
+DEFAULT_SLOW_WEBHOOK_MS = 2000
+
+# Límites superiores de los buckets (segundos y número de consultas SQL)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_current_timer = ContextVar('shopifysteam_webhook_timer', default=None)
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[index] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines, cumulative = [], 0
+        for upper, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{upper}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.total}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class WebhookMetrics:
+    """Histogramas en memoria de duración y consultas SQL por endpoint y etapa.
+
+    Los valores son propios de cada proceso: con varios workers, cada uno
+    expone sus propios contadores y el agregado lo hace quien los recolecta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._queries = {}
+
+    def observe(self, endpoint, stage, seconds, queries):
+        key = (endpoint, stage)
+        with self._lock:
+            if key not in self._durations:
+                self._durations[key] = _Histogram(DURATION_BUCKETS)
+                self._queries[key] = _Histogram(QUERY_BUCKETS)
+            self._durations[key].observe(seconds)
+            self._queries[key].observe(queries)
+
+    def render_prometheus(self):
+        """Devuelve los histogramas en el formato de texto de Prometheus."""
+        duration_name = 'shopifysteam_webhook_stage_duration_seconds'
+        queries_name = 'shopifysteam_webhook_stage_queries'
+        lines = [
+            f'# HELP {duration_name} Time spent in each webhook processing stage.',
+            f'# TYPE {duration_name} histogram',
+        ]
+        with self._lock:
+            keys = sorted(self._durations)
+            for endpoint, stage in keys:
+                lines += self._durations[endpoint, stage].render(
+                    duration_name, f'endpoint="{endpoint}",stage="{stage}"')
+            lines += [
+                f'# HELP {queries_name} SQL queries executed in each webhook processing stage.',
+                f'# TYPE {queries_name} histogram',
+            ]
+            for endpoint, stage in keys:
+                lines += self._queries[endpoint, stage].render(
+                    queries_name, f'endpoint="{endpoint}",stage="{stage}"')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = WebhookMetrics()
+
+
+class WebhookTimer:
+    """Mide un webhook completo y cada una de sus etapas.
+
+    Uso::
+
+        with WebhookTimer('shopify_orders', env):
+            with stage('verify_hmac'):
+                ...
+
+    Al salir se registran en ``METRICS`` el total y cada etapa, y si el total
+    supera ``shopifysteam.slow_webhook_ms`` se escribe una línea de log con
+    el desglose en JSON.
+    """
+
+    def __init__(self, endpoint, env):
+        self.endpoint = endpoint
+        self.env = env
+        self.stages = []
+        self._token = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._queries = self.env.cr.sql_log_count
+        self._token = _current_timer.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_timer.reset(self._token)
+        elapsed = time.perf_counter() - self._started
+        queries = self.env.cr.sql_log_count - self._queries
+        METRICS.observe(self.endpoint, 'total', elapsed, queries)
+        for name, seconds, stage_queries in self.stages:
+            METRICS.observe(self.endpoint, name, seconds, stage_queries)
+        try:
+            self._log_if_slow(elapsed, queries, failed=exc_type is not None)
+        except Exception:
+            _logger.debug("Could not check slow webhook threshold", exc_info=True)
+        return False
+
+    @contextmanager
+    def stage(self, name):
+        started, queries = time.perf_counter(), self.env.cr.sql_log_count
+        try:
+            yield
+        finally:
+            self.stages.append((
+                name, time.perf_counter() - started, self.env.cr.sql_log_count - queries))
+
+    def _log_if_slow(self, elapsed, queries, failed=False):
+        threshold = int(self.env['ir.config_parameter'].sudo().get_param(
+            SLOW_WEBHOOK_PARAM, DEFAULT_SLOW_WEBHOOK_MS))
+        elapsed_ms = elapsed * 1000
+        if not threshold or elapsed_ms < threshold:
+            return
+        _logger.warning("Slow webhook: %s", json.dumps({
+            'endpoint': self.endpoint,
+            'total_ms': round(elapsed_ms, 1),
+            'queries': queries,
+            'failed': failed,
+            'stages': [
+                {'stage': name, 'ms': round(seconds * 1000, 1), 'queries': stage_queries}
+                for name, seconds, stage_queries in self.stages
+            ],
+        }))
+
+
+@contextmanager
+def stage(name):
+    """Etapa del ``WebhookTimer`` activo; sin temporizador activo no hace nada."""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
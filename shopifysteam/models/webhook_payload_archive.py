@@ -0,0 +1,8 @@
+from odoo import fields, models
+
+
+class WebhookPayloadArchive(models.Model):
+    _inherit = 'webhook.payload.archive'
+
+    provider = fields.Selection(
+        selection_add=[('shopify', 'Shopify')], ondelete={'shopify': 'cascade'})
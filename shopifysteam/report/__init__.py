@@ -0,0 +1 @@
+from . import mercantil_payment_report
\ No newline at end of file
@@ -0,0 +1,123 @@
+from odoo import fields, models, tools
+from odoo.tools import SQL
+
+
+class MercantilPaymentReport(models.Model):
+    """Conciliación USD/VES de pagos Mercantil, como vista SQL de solo lectura.
+
+    Une cada account.payment con su registro Mercantil, la factura de la
+    orden y la tasa BCV vigente en la fecha del pago, para que list, pivot y
+    graph se resuelvan con un solo ``read_group`` agregado en la base de datos.
+
+    Los montos se expresan en la moneda de la compañía, que es la base de
+    las tasas BCV; la factura se ubica por las claves foráneas de las líneas
+    de venta y no por ``invoice_origin``. Solo cuentan los pagos publicados,
+    y el monto VES del registro Mercantil se reparte entre sus pagos en
+    proporción a cada uno, de modo que los totales no lo repiten.
+    """
+    _name = 'mercantil.payment.report'
+    _description = 'Mercantil Payment Reconciliation'
+    _auto = False
+    _rec_name = 'date'
+    _order = 'date desc'
+
+    date = fields.Date(string='Payment Date', readonly=True)
+    payment_id = fields.Many2one('account.payment', string='Payment', readonly=True)
+    pago_id = fields.Many2one('sale.order.pago.mercantil', string='Mercantil Payment', readonly=True)
+    order_id = fields.Many2one('sale.order', string='Sale Order', readonly=True)
+    invoice_id = fields.Many2one('account.move', string='Invoice', readonly=True)
+    partner_id = fields.Many2one('res.partner', string='Customer', readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    currency_id = fields.Many2one('res.currency', string='Currency', readonly=True)
+    ves_currency_id = fields.Many2one('res.currency', string='VES Currency', readonly=True)
+    amount = fields.Monetary(string='Amount (Company Currency)', currency_field='currency_id', readonly=True)
+    amount_ves = fields.Monetary(
+        string='Amount Charged (VES)', currency_field='ves_currency_id', readonly=True)
+    fixed_exchange_rate = fields.Float(
+        string='Fixed Exchange Rate', digits=(12, 4), aggregator='avg', readonly=True)
+    bcv_rate = fields.Float(
+        string='BCV Rate', digits=(12, 4), aggregator='avg', readonly=True)
+    amount_ves_bcv = fields.Monetary(
+        string='Amount at BCV Rate (VES)', currency_field='ves_currency_id', readonly=True)
+    ves_difference = fields.Monetary(
+        string='Difference (VES)', currency_field='ves_currency_id', readonly=True)
+
+    _depends = {
+        'account.payment': ['date', 'state', 'amount_company_currency_signed', 'partner_id', 'company_id', 'mercantil_payment'],
+        'sale.order.pago.mercantil': ['order_id', 'amount_ves', 'fixed_exchange_rate', 'ves_currency_id'],
+        'sale.order.line': ['order_id', 'invoice_lines'],
+        'account.move.line': ['move_id'],
+        'account.move': ['move_type'],
+        'res.company': ['currency_id'],
+        'steamtasabcv.exchange.rate': ['name', 'rate', 'currency_id', 'company_id', 'active'],
+    }
+
+    def _query(self):
+        return SQL(
+            """
+              WITH payments AS (
+                   -- Solo pagos publicados; share es la parte del monto VES del
+                   -- registro Mercantil que corresponde a cada pago (pagos parciales)
+                   SELECT ap.id,
+                          ap.date,
+                          ap.partner_id,
+                          ap.company_id,
+                          ap.mercantil_payment,
+                          ABS(ap.amount_company_currency_signed) AS amount,
+                          ABS(ap.amount_company_currency_signed)
+                              / NULLIF(SUM(ABS(ap.amount_company_currency_signed))
+                                       OVER (PARTITION BY ap.mercantil_payment), 0) AS share
+                     FROM account_payment ap
+                    WHERE ap.mercantil_payment IS NOT NULL
+                      AND ap.state IN ('in_process', 'paid')
+                   )
+            SELECT p.id AS id,
+                   p.date AS date,
+                   p.id AS payment_id,
+                   spm.id AS pago_id,
+                   spm.order_id AS order_id,
+                   inv.id AS invoice_id,
+                   p.partner_id AS partner_id,
+                   p.company_id AS company_id,
+                   rc.currency_id AS currency_id,
+                   spm.ves_currency_id AS ves_currency_id,
+                   p.amount AS amount,
+                   spm.amount_ves * p.share AS amount_ves,
+                   spm.fixed_exchange_rate AS fixed_exchange_rate,
+                   bcv.rate AS bcv_rate,
+                   p.amount * COALESCE(bcv.rate, 0) AS amount_ves_bcv,
+                   COALESCE(spm.amount_ves * p.share, 0)
+                       - p.amount * COALESCE(bcv.rate, 0) AS ves_difference
+              FROM payments p
+              JOIN res_company rc ON rc.id = p.company_id
+              JOIN sale_order_pago_mercantil spm ON spm.id = p.mercantil_payment
+         LEFT JOIN LATERAL (
+                   SELECT aml.move_id AS id
+                     FROM sale_order_line sol
+                     JOIN sale_order_line_invoice_rel rel ON rel.order_line_id = sol.id
+                     JOIN account_move_line aml ON aml.id = rel.invoice_line_id
+                     JOIN account_move am ON am.id = aml.move_id
+                    WHERE sol.order_id = spm.order_id
+                      AND am.move_type = 'out_invoice'
+                 ORDER BY aml.move_id
+                    LIMIT 1
+                   ) inv ON TRUE
+         LEFT JOIN LATERAL (
+                   SELECT r.rate
+                     FROM steamtasabcv_exchange_rate r
+                    WHERE r.currency_id = spm.ves_currency_id
+                      AND r.company_id = p.company_id
+                      AND r.active
+                      AND r.name <= p.date
+                 ORDER BY r.name DESC, r.id DESC
+                    LIMIT 1
+                   ) bcv ON TRUE
+            """
+        )
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(SQL(
+            "CREATE OR REPLACE VIEW %s AS (%s)",
+            SQL.identifier(self._table), self._query(),
+        ))
@@ -0,0 +1,3 @@
+from . import test_product_resolution
+from . import test_webhook_benchmark
+from . import test_order_import
\ No newline at end of file
@@ -0,0 +1,109 @@
+import copy
+import json
+import logging
+import os
+import tempfile
+import time
+
+from odoo.tests import tagged
+from odoo.tools import file_open
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+_logger = logging.getLogger(__name__)
+
+BENCHMARK_ORDERS = 500
+# Mínimo muy holgado; el objetivo en producción es de varios cientos de órdenes/s
+MIN_ORDERS_PER_SECOND = 20
+
+
+@tagged('post_install', '-at_install')
+class TestShopifyOrderImport(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with file_open('shopifysteam/tests/fixtures/shopify_order.json') as fixture:
+            cls.recorded_order = json.load(fixture)
+
+    def setUp(self):
+        super().setUp()
+        # _run confirma cada bloque con cr.commit(); en la prueba basta con vaciar el ORM
+        self.patch(self.env.cr, 'commit', self.env.flush_all)
+
+    def _order(self, number, **values):
+        order = copy.deepcopy(self.recorded_order)
+        order.update({
+            'id': 8000000000000 + number,
+            'name': f"#H{number}",
+            'email': f"historico{number % 50}@example.com",
+        })
+        order['customer'] = dict(order['customer'], id=9000000000000 + number % 50,
+                                 email=order['email'], phone=f"+58416{number % 50:07d}")
+        order['line_items'] = [dict(
+            item, id=item['id'] + number * 10 + index, variant_id=item['variant_id'] + index,
+            sku=f"STEAM-HIST-{index:02d}",
+        ) for index, item in enumerate(order['line_items'] * 3)]
+        order.update(values)
+        return order
+
+    def _import(self, lines, chunk_size=100):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as export:
+            export.write('\n'.join(lines) + '\n')
+        self.addCleanup(os.unlink, export.name)
+        job = self.env['shopify.order.import'].create({
+            'name': 'Historical orders',
+            'file_path': export.name,
+            'shop': 'steam-history.myshopify.com',
+            'chunk_size': chunk_size,
+        })
+        job.action_start()
+        started = time.perf_counter()
+        job._run()
+        return job, time.perf_counter() - started
+
+    def _sale_order(self, job, shopify_id):
+        return self.env['shopify.sync.map']._lookup_record(job.shop, 'order', shopify_id)
+
+    def test_statuses_and_malformed_lines(self):
+        orders = [
+            self._order(1),
+            self._order(2, financial_status='paid'),
+            self._order(3, financial_status='refunded'),
+            self._order(4, cancelled_at='2024-03-16T09:00:00-04:00'),
+            self._order(5, financial_status='voided'),
+        ]
+        lines = [json.dumps(order) for order in orders]
+        lines.insert(2, '{"id": 8000000000099, "name": "#H99", ')
+        job, _elapsed = self._import(lines, chunk_size=2)
+
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.lines_read, 6)
+        self.assertEqual(job.orders_created, 4)
+        self.assertEqual(job.orders_skipped, 2)  # la línea dañada y la orden anulada
+        self.assertEqual(job.progress, 100.0)
+        self.assertEqual(self._sale_order(job, orders[0]['id']).state, 'draft')
+        self.assertEqual(self._sale_order(job, orders[1]['id']).state, 'sale')
+        self.assertEqual(self._sale_order(job, orders[2]['id']).state, 'cancel')
+        self.assertEqual(self._sale_order(job, orders[3]['id']).state, 'cancel')
+        self.assertFalse(self._sale_order(job, orders[4]['id']))
+
+    def test_resume_skips_imported_orders(self):
+        lines = [json.dumps(self._order(number)) for number in range(10)]
+        job, _elapsed = self._import(lines, chunk_size=4)
+        job.action_reset()
+        job.action_start()
+        job._run()
+        self.assertEqual(job.orders_created, 0)
+        self.assertEqual(job.orders_skipped, 10)
+
+    def test_benchmark_throughput(self):
+        lines = [json.dumps(self._order(number)) for number in range(BENCHMARK_ORDERS)]
+        job, elapsed = self._import(lines, chunk_size=250)
+        rate = job.orders_created / elapsed
+        _logger.info(
+            "shopify.order.import: %d orders (%d lines each) in %.2f s, %.0f orders/s",
+            job.orders_created, len(self.recorded_order['line_items']) * 3, elapsed, rate)
+        self.assertEqual(job.orders_created, BENCHMARK_ORDERS)
+        self.assertGreater(rate, MIN_ORDERS_PER_SECOND,
+                           f"Import ran at {rate:.0f} orders/s, floor is {MIN_ORDERS_PER_SECOND}")
@@ -0,0 +1,74 @@
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestProductResolutionQueries(TransactionCase):
+    """El número de consultas para resolver los productos de un carrito no depende de sus líneas."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Inbox = cls.env['shopify.webhook.inbox'].new({'shop': 'test-shop.myshopify.com'})
+        cls.products = cls.env['product.product'].create([{
+            'name': f'Shopify Test Product {index}',
+            'default_code': f'SHOPIFY-TEST-{index:04d}',
+            'type': 'consu',
+        } for index in range(200)])
+
+    def _line_items(self, count, variant_offset):
+        return [{
+            'id': 910000 + variant_offset + index,
+            'variant_id': 710000 + variant_offset + index,
+            'sku': f'SHOPIFY-TEST-{index:04d}',
+            'title': f'Shopify Test Product {index}',
+            'price': '10.00',
+            'quantity': 1,
+        } for index in range(count)]
+
+    def _resolve(self, line_items):
+        """Devuelve (consultas SQL ejecutadas, ids de producto) al resolver ``line_items``."""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        queries = self.cr.sql_log_count
+        product_ids = self.Inbox._get_or_create_products(line_items)
+        self.env.flush_all()
+        return self.cr.sql_log_count - queries, product_ids
+
+    def test_known_skus_constant_queries(self):
+        small_cart = self._line_items(1, variant_offset=0)
+        large_cart = self._line_items(200, variant_offset=1000)
+        small_queries, small_ids = self._resolve(small_cart)
+        large_queries, large_ids = self._resolve(large_cart)
+        self.assertEqual(small_ids, self.products[:1].ids)
+        self.assertEqual(large_ids, self.products.ids)
+        self.assertEqual(small_queries, large_queries,
+                         "Resolving a 200-line cart must cost the same queries as a 1-line cart")
+
+    def test_mapped_variants_constant_queries(self):
+        small_cart = self._line_items(1, variant_offset=2000)
+        large_cart = self._line_items(200, variant_offset=3000)
+        # La primera resolución registra las variantes en shopify.sync.map
+        self._resolve(small_cart)
+        self._resolve(large_cart)
+        small_queries, small_ids = self._resolve(small_cart)
+        large_queries, large_ids = self._resolve(large_cart)
+        self.assertEqual(small_ids, self.products[:1].ids)
+        self.assertEqual(large_ids, self.products.ids)
+        self.assertEqual(small_queries, large_queries)
+
+    def test_new_products_single_create(self):
+        line_items = [dict(item, sku=f'SHOPIFY-NEW-{index:04d}')
+                      for index, item in enumerate(self._line_items(200, variant_offset=4000))]
+        created = []
+        Product = type(self.env['product.product'])
+        original_create = Product.create
+
+        def create(records, vals_list):
+            created.append(len(vals_list) if isinstance(vals_list, list) else 1)
+            return original_create(records, vals_list)
+
+        with self.patch(Product, 'create', create):
+            _queries, product_ids = self._resolve(line_items)
+        self.assertEqual(created, [200], "Missing products must be created with a single create call")
+        self.assertEqual(len(set(product_ids)), 200)
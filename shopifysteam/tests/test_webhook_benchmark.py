@@ -0,0 +1,317 @@
+import base64
+import copy
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import math
+import os
+import time
+import uuid
+from collections import defaultdict
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tools import file_open
+
+from odoo.addons.account.tests.common import AccountTestInvoicingHttpCommon
+from odoo.addons.pagomercantilsteam.models.mercantil_crypto import MercantilCipher
+
+_logger = logging.getLogger(__name__)
+
+SHOP = 'steam-benchmark.myshopify.com'
+SHOPIFY_SECRET = 'shopify-benchmark-secret'
+MERCANTIL_SECRET = 'mercantil-benchmark-secret'
+SHOPIFY_URL = '/v1/webhooks/shopify/orders'
+MERCANTIL_URL = '/v1/webhooks/mercantil/payment/confirmation'
+
+ROUNDS = int(os.environ.get('SHOPIFYSTEAM_BENCH_ROUNDS') or 5)
+# Por escenario: máximo de consultas SQL por entrega (webhook + cron de la
+# bandeja) y p95 de la latencia total en ms. Se pueden ajustar con
+# SHOPIFYSTEAM_BENCH_BUDGETS='{"pending_200_lines": {"p95_ms": 60000}}'.
+BUDGETS = {
+    'pending_1_line': {'queries': 450, 'p95_ms': 3000},
+    'pending_200_lines': {'queries': 3000, 'p95_ms': 30000},
+    'paid_1_line': {'queries': 450, 'p95_ms': 3000},
+    'paid_200_lines': {'queries': 3000, 'p95_ms': 30000},
+    'new_customer': {'queries': 450, 'p95_ms': 3000},
+    'returning_customer': {'queries': 450, 'p95_ms': 3000},
+    'duplicate_delivery': {'queries': 60, 'p95_ms': 500},
+    'mercantil_payment': {'queries': 400, 'p95_ms': 3000},
+    'mercantil_duplicate': {'queries': 60, 'p95_ms': 500},
+}
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano (nearest-rank)."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+@tagged('post_install', '-at_install', 'webhook_benchmark')
+class TestWebhookBenchmark(AccountTestInvoicingHttpCommon):
+    """Reenvía webhooks de Shopify y Mercantil grabados y sintéticos contra los endpoints reales.
+
+    Cada entrega se mide de punta a punta: la petición HTTP firmada (o
+    cifrada) y el ``_cron_process_inbox`` que la convierte en orden. Por
+    escenario se registran p50/p95/p99 y el número de consultas SQL, y la
+    prueba falla si se supera el presupuesto de ``BUDGETS``.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with file_open('shopifysteam/tests/fixtures/shopify_order.json') as fixture:
+            cls.recorded_order = json.load(fixture)
+        with file_open('shopifysteam/tests/fixtures/mercantil_confirmation.json') as fixture:
+            cls.recorded_notification = json.load(fixture)
+
+        cls.env['ir.config_parameter'].sudo().set_param('shopify.api_secret', SHOPIFY_SECRET)
+        for key, value in {
+            'secret_key': MERCANTIL_SECRET,
+            'mercantil_payment_url': 'https://mercantil.example.com/pay',
+            'integrator_id': '31',
+        }.items():
+            cls.env['ir.config_parameter'].sudo().set_param(f'pago_mercantil.{key}', value)
+
+        company = cls.company_data['company']
+        company.mercantil_merchant_id = '200284'
+        # Los webhooks públicos buscan el diario de banco con sudo(), sin filtrar por compañía
+        cls.company_data['default_journal_bank'].sequence = -1
+        ves = cls.env.ref('base.VES')
+        ves.active = True
+        cls.env['steamtasabcv.exchange.rate'].create({
+            'name': fields.Date.today(),
+            'currency_id': ves.id,
+            'company_id': company.id,
+            'rate': 36.4965,
+        })
+
+        cls.cipher = MercantilCipher(hashlib.sha256(MERCANTIL_SECRET.encode('utf-8')).digest()[:16])
+        cls.budgets = copy.deepcopy(BUDGETS)
+        for scenario, budget in json.loads(os.environ.get('SHOPIFYSTEAM_BENCH_BUDGETS') or '{}').items():
+            cls.budgets.setdefault(scenario, {}).update(budget)
+        cls.sequence = itertools.count(1)
+
+    def setUp(self):
+        super().setUp()
+        self.Inbox = self.env['shopify.webhook.inbox']
+        self.samples = defaultdict(lambda: defaultdict(list))
+        # El cron confirma cada webhook con cr.commit(); en la prueba basta con vaciar el ORM
+        self.patch(self.env.cr, 'commit', self.env.flush_all)
+
+    # -------------------------------------------------------------------------
+    # Payloads
+    # -------------------------------------------------------------------------
+
+    def _order_payload(self, lines=1, financial_status='pending', customer=None):
+        """Orden sintética a partir de la grabada, con ``lines`` líneas y un cliente nuevo si no se da."""
+        number = next(self.sequence)
+        order = copy.deepcopy(self.recorded_order)
+        order.update({
+            'id': self.recorded_order['id'] + number,
+            'name': f"#{100000 + number}",
+            'financial_status': financial_status,
+            'created_at': fields.Datetime.now().isoformat() + 'Z',
+        })
+        if customer is None:
+            customer = self._new_customer(number)
+        order['customer'] = customer
+        order['email'] = customer['email']
+        for address in ('billing_address', 'shipping_address'):
+            order[address]['phone'] = customer['phone']
+        recorded_line = self.recorded_order['line_items'][0]
+        order['line_items'] = [dict(
+            recorded_line,
+            id=recorded_line['id'] + number * 1000 + index,
+            variant_id=recorded_line['variant_id'] + index,
+            sku=f"STEAM-BENCH-{index:04d}",
+            title=f"Tarjeta de regalo Steam {index}",
+        ) for index in range(lines)]
+        return order
+
+    def _new_customer(self, number):
+        customer = copy.deepcopy(self.recorded_order['customer'])
+        customer.update({
+            'id': customer['id'] + number,
+            'email': f"cliente{number}@example.com",
+            'phone': f"+58414{number:07d}",
+        })
+        return customer
+
+    # -------------------------------------------------------------------------
+    # Entregas
+    # -------------------------------------------------------------------------
+
+    def _measure(self, function):
+        """Ejecuta ``function`` y devuelve (resultado, ms, consultas SQL).
+
+        El servidor HTTP de la prueba usa el mismo cursor, de modo que
+        ``sql_log_count`` también cuenta las consultas del controlador.
+        """
+        self.env.flush_all()
+        queries = self.cr.sql_log_count
+        started = time.perf_counter()
+        result = function()
+        self.env.flush_all()
+        elapsed = (time.perf_counter() - started) * 1000
+        count = self.cr.sql_log_count - queries
+        self.env.invalidate_all()
+        return result, elapsed, count
+
+    def _post_shopify(self, payload, webhook_id=None, topic='orders/create'):
+        body = json.dumps(payload).encode('utf-8')
+        signature = base64.b64encode(
+            hmac.new(SHOPIFY_SECRET.encode('utf-8'), body, hashlib.sha256).digest()).decode()
+        headers = {
+            'Content-Type': 'application/json',
+            'X-Shopify-Hmac-Sha256': signature,
+            'X-Shopify-Topic': topic,
+            'X-Shopify-Shop-Domain': SHOP,
+            'X-Shopify-Webhook-Id': webhook_id or str(uuid.uuid4()),
+        }
+        response, elapsed, queries = self._measure(
+            lambda: self.url_open(SHOPIFY_URL, data=body, headers=headers, timeout=120))
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json(), elapsed, queries
+
+    def _deliver(self, scenario, payload, webhook_id=None):
+        """Entrega una orden y procesa la bandeja; ``scenario=None`` no registra la medición."""
+        result, http_ms, http_queries = self._post_shopify(payload, webhook_id)
+        _none, process_ms, process_queries = self._measure(self.Inbox._cron_process_inbox)
+        if scenario:
+            self._record(scenario, http_ms, http_queries, process_ms, process_queries)
+        if result.get('inbox_id'):
+            item = self.Inbox.browse(result['inbox_id'])
+            self.assertEqual(item.state, 'done', item.last_error)
+            return result, item
+        return result, self.Inbox
+
+    def _post_mercantil(self, invoice_number, guid):
+        notification = copy.deepcopy(self.recorded_notification)
+        notification['infoMsg']['guId'] = guid
+        notification['webhookNotificationIn']['numeroFactura'] = invoice_number
+        body = json.dumps({'data': self.cipher.encrypt(notification)}).encode('utf-8')
+        response, elapsed, queries = self._measure(lambda: self.url_open(
+            MERCANTIL_URL, data=body, headers={'Content-Type': 'application/json'}, timeout=120))
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json(), elapsed, queries
+
+    # -------------------------------------------------------------------------
+    # Reporte y presupuestos
+    # -------------------------------------------------------------------------
+
+    def _record(self, scenario, http_ms, http_queries, process_ms=0.0, process_queries=0):
+        samples = self.samples[scenario]
+        samples['http_ms'].append(http_ms)
+        samples['http_queries'].append(http_queries)
+        samples['total_ms'].append(http_ms + process_ms)
+        samples['total_queries'].append(http_queries + process_queries)
+
+    def _check_budget(self, scenario):
+        samples = self.samples[scenario]
+        total_ms, total_queries = samples['total_ms'], samples['total_queries']
+        p50, p95, p99 = (percentile(total_ms, pct) for pct in (50, 95, 99))
+        _logger.info(
+            "Webhook benchmark %s (%d runs): latency p50/p95/p99 %.1f/%.1f/%.1f ms "
+            "(HTTP p95 %.1f ms), SQL queries p50/max %d/%d (HTTP max %d)",
+            scenario, len(total_ms), p50, p95, p99, percentile(samples['http_ms'], 95),
+            percentile(total_queries, 50), max(total_queries), max(samples['http_queries']))
+        budget = self.budgets[scenario]
+        self.assertLessEqual(
+            max(total_queries), budget['queries'],
+            f"{scenario}: {max(total_queries)} queries per delivery, budget is {budget['queries']}")
+        self.assertLessEqual(
+            p95, budget['p95_ms'],
+            f"{scenario}: p95 latency {p95:.1f} ms, budget is {budget['p95_ms']} ms")
+
+    # -------------------------------------------------------------------------
+    # Escenarios
+    # -------------------------------------------------------------------------
+
+    def _run_order_scenario(self, scenario, lines, financial_status, expected_message):
+        # La primera entrega crea los productos y calienta las cachés: no se mide
+        self._deliver(None, self._order_payload(lines, financial_status))
+        for _i in range(ROUNDS):
+            _result, item = self._deliver(scenario, self._order_payload(lines, financial_status))
+            self.assertEqual(item.result_message, expected_message)
+            self.assertEqual(len(item.sale_order_id.order_line), lines)
+        self._check_budget(scenario)
+        return item.sale_order_id
+
+    def test_pending_orders(self):
+        for scenario, lines in (('pending_1_line', 1), ('pending_200_lines', 200)):
+            order = self._run_order_scenario(
+                scenario, lines, 'pending', "Order Draft Created, Link Sent")
+            pago = self.env['sale.order.pago.mercantil'].search([('order_id', '=', order.id)])
+            self.assertTrue(pago.payment_link)
+        self.assertEqual(
+            max(self.samples['pending_1_line']['http_queries']),
+            max(self.samples['pending_200_lines']['http_queries']),
+            "Enqueuing a webhook must not depend on the number of lines")
+
+    def test_paid_orders(self):
+        for scenario, lines in (('paid_1_line', 1), ('paid_200_lines', 200)):
+            order = self._run_order_scenario(scenario, lines, 'paid', "Order Created and Paid")
+            self.assertEqual(order.state, 'sale')
+            self.assertIn(order.invoice_ids.payment_state, ('paid', 'in_payment'))
+
+    def test_customers(self):
+        Partner = self.env['res.partner']
+        self._deliver(None, self._order_payload())
+        partners = Partner.search_count([])
+        for _i in range(ROUNDS):
+            self._deliver('new_customer', self._order_payload())
+        self.assertEqual(Partner.search_count([]), partners + ROUNDS)
+        self._check_budget('new_customer')
+
+        customer = self._new_customer(next(self.sequence))
+        _result, first = self._deliver(None, self._order_payload(customer=customer))
+        partners = Partner.search_count([])
+        for _i in range(ROUNDS):
+            _result, item = self._deliver('returning_customer', self._order_payload(customer=customer))
+            self.assertEqual(item.sale_order_id.partner_id, first.sale_order_id.partner_id)
+        self.assertEqual(Partner.search_count([]), partners)
+        self._check_budget('returning_customer')
+
+    def test_duplicate_delivery(self):
+        payload = self._order_payload()
+        webhook_id = str(uuid.uuid4())
+        _result, first = self._deliver(None, payload, webhook_id)
+        orders = self.env['sale.order'].search_count([])
+        for _i in range(ROUNDS):
+            result, item = self._deliver('duplicate_delivery', payload, webhook_id)
+            self.assertEqual(item, first)
+            self.assertEqual(result['message'], first.result_message)
+        self.assertEqual(self.env['sale.order'].search_count([]), orders)
+        self.assertFalse(self.Inbox.search_count([('state', '=', 'pending')]))
+        self._check_budget('duplicate_delivery')
+
+    def test_mercantil_confirmation(self):
+        PagoMercantil = self.env['sale.order.pago.mercantil']
+        pagos = PagoMercantil
+        for _i in range(ROUNDS + 1):
+            _result, item = self._deliver(None, self._order_payload())
+            pagos |= PagoMercantil.search([('order_id', '=', item.sale_order_id.id)])
+
+        guids = {}
+        for index, pago in enumerate(pagos):
+            guids[pago] = str(uuid.uuid4())
+            result, elapsed, queries = self._post_mercantil(pago.invoice_number, guids[pago])
+            self.assertEqual(result['codigo'], '00', result)
+            self.assertIn(pago.order_id.invoice_ids.payment_state, ('paid', 'in_payment'))
+            self.assertTrue(pago.webhook_archive_id)
+            if index:
+                self._record('mercantil_payment', elapsed, queries)
+        self._check_budget('mercantil_payment')
+
+        Archive = self.env['webhook.payload.archive']
+        archived = Archive.search_count([('provider', '=', 'mercantil')])
+        for pago in pagos[1:]:
+            result, elapsed, queries = self._post_mercantil(pago.invoice_number, guids[pago])
+            self.assertEqual(result['codigo'], '06', result)
+            self._record('mercantil_duplicate', elapsed, queries)
+        self.assertEqual(Archive.search_count([('provider', '=', 'mercantil')]), archived,
+                         "Duplicate notifications must not be archived again")
+        self._check_budget('mercantil_duplicate')
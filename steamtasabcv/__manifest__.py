@@ -12,6 +12,7 @@
     "license": "OPL-1",
     "data": [
         "views/exchange_rate_view.xml",
+        "views/rate_backfill_view.xml",
         "security/ir.model.access.csv",
         "data/currency_data.xml",
         "data/cron_data.xml",
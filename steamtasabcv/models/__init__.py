@@ -1 +1,2 @@
-from . import exchange_rate
\ No newline at end of file
+from . import exchange_rate
+from . import rate_backfill
\ No newline at end of file
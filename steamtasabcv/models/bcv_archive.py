@@ -0,0 +1,132 @@
+import csv
+import os
+import re
+from datetime import date, datetime
+
+from .bcv_scraper import BCV_CURRENCY_CONTAINERS, parse_bcv_number
+
+BCV_CURRENCY_CODES = set(BCV_CURRENCY_CONTAINERS.values())
+
+_DATE_RE = re.compile(r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})|(\d{4})-(\d{2})-(\d{2})')
+_VALUE_DATE_RE = re.compile(r'Fecha\s+Valor\s*:?\s*(\d{1,2}/\d{1,2}/\d{4})', re.I)
+
+
+def parse_bcv_date(value):
+    """Normalize 'dd/mm/yyyy', 'yyyy-mm-dd', date or datetime values to a date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    match = _DATE_RE.search(str(value or ''))
+    if not match:
+        return None
+    if match.group(1):
+        day, month, year = match.group(1, 2, 3)
+    else:
+        year, month, day = match.group(4, 5, 6)
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def _to_float(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return parse_bcv_number(str(value))
+    except ValueError:
+        return None
+
+
+def iter_bcv_archive_rows(path):
+    """
+    Stream ``(date, currency code, bolivares per unit)`` rows from a BCV archive file.
+
+    Supported formats:
+
+    * ``.xls`` / ``.xlsx``: the BCV "tipo de cambio" workbooks, one sheet per
+      day with a "Fecha Valor: dd/mm/yyyy" header and one row per currency;
+      the last numeric cell of the row is the rate.
+    * ``.csv``: either long (``fecha;moneda;tasa``) or wide (``fecha;USD;EUR;...``)
+      layout, with comma or dot decimals and any common delimiter.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        yield from _iter_csv_rows(path)
+    elif extension in ('.xls', '.xlsx'):
+        for sheet_rows in _iter_workbook_sheets(path, extension):
+            yield from _iter_sheet_rows(sheet_rows)
+    else:
+        raise ValueError(f"Unsupported BCV archive format: {path}")
+
+
+def _iter_csv_rows(path):
+    with open(path, newline='', encoding='utf-8-sig') as archive:
+        dialect = csv.Sniffer().sniff(archive.read(4096), delimiters=';,\t|')
+        archive.seek(0)
+        reader = csv.reader(archive, dialect)
+        header = [column.strip() for column in next(reader, [])]
+        lowered = [column.lower() for column in header]
+        long_layout = any(column in ('moneda', 'currency') for column in lowered)
+        for row in reader:
+            if not row:
+                continue
+            rate_date = parse_bcv_date(row[0])
+            if not rate_date:
+                continue
+            if long_layout:
+                code = row[1].strip().upper()
+                rate = _to_float(row[2]) if len(row) > 2 else None
+                if code in BCV_CURRENCY_CODES and rate:
+                    yield rate_date, code, rate
+                continue
+            for code, value in zip(header[1:], row[1:]):
+                code = code.upper()
+                rate = _to_float(value) if value.strip() else None
+                if code in BCV_CURRENCY_CODES and rate:
+                    yield rate_date, code, rate
+
+
+def _iter_workbook_sheets(path, extension):
+    """Yield each sheet as an iterator of row tuples, without loading the whole workbook."""
+    if extension == '.xlsx':
+        import openpyxl
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                yield sheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        import xlrd
+        workbook = xlrd.open_workbook(path, on_demand=True)
+        try:
+            for index in range(workbook.nsheets):
+                sheet = workbook.sheet_by_index(index)
+                yield (sheet.row_values(row) for row in range(sheet.nrows))
+                workbook.unload_sheet(index)
+        finally:
+            workbook.release_resources()
+
+
+def _iter_sheet_rows(rows):
+    rate_date = None
+    for row in rows:
+        cells = [cell for cell in row if cell not in (None, '')]
+        if not cells:
+            continue
+        if rate_date is None:
+            for cell in cells:
+                match = _VALUE_DATE_RE.search(str(cell))
+                if match:
+                    rate_date = parse_bcv_date(match.group(1))
+                    break
+            continue
+        code = next((str(cell).strip().upper() for cell in cells
+                     if str(cell).strip().upper() in BCV_CURRENCY_CODES), None)
+        if not code:
+            continue
+        numbers = [number for number in map(_to_float, cells) if number]
+        if numbers:
+            yield rate_date, code, numbers[-1]
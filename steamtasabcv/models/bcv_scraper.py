@@ -0,0 +1,176 @@
+import logging
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import date
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_logger = logging.getLogger(__name__)
+
+BCV_URL = "https://www.bcv.org.ve/"
+BCV_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Ids of the rate containers on bcv.org.ve and the currency each one publishes
+BCV_CURRENCY_CONTAINERS = {
+    'dolar': 'USD',
+    'euro': 'EUR',
+    'yuan': 'CNY',
+    'lira': 'TRY',
+    'rublo': 'RUB',
+}
+
+_CONTAINER_RE = re.compile(
+    r'<div[^>]*\bid="(%s)"[^>]*>' % '|'.join(BCV_CURRENCY_CONTAINERS))
+_DIV_TAG_RE = re.compile(r'<(/?)div\b')
+_STRONG_RE = re.compile(r'<strong>\s*([^<]*?)\s*</strong>')
+_VALUE_DATE_RE = re.compile(
+    r'Fecha\s+Valor:.*?content="(\d{4})-(\d{2})-(\d{2})', re.S)
+
+
+def parse_bcv_number(text):
+    """Convert a BCV formatted number to float: '36,50' -> 36.5, '1.234,56' -> 1234.56."""
+    clean_text = text.replace(' ', '').replace('\xa0', '')
+    if ',' in clean_text:
+        clean_text = clean_text.replace('.', '').replace(',', '.')
+    return float(clean_text)
+
+
+def _container_end(content, start, limit):
+    """Position of the ``</div>`` closing the container opened just before ``start``, at most ``limit``."""
+    depth = 1
+    for tag in _DIV_TAG_RE.finditer(content, start, limit):
+        depth += -1 if tag.group(1) else 1
+        if not depth:
+            return tag.start()
+    return limit
+
+
+def extract_bcv_rates(content):
+    """
+    Extract every published rate and the value date from the BCV home page.
+
+    Only the rate containers (``div#dolar``, ``div#euro``, ...) and the
+    "Fecha Valor" element are looked at; the rest of the page is never parsed.
+    Each rate is read inside its own container, so a container without a
+    value never takes the next one's.
+
+    Args:
+        content (bytes | str): Raw HTML of https://www.bcv.org.ve/.
+
+    Returns:
+        tuple: (value date or None, {currency code: bolivares per unit})
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', errors='replace')
+    rates = {}
+    containers = list(_CONTAINER_RE.finditer(content))
+    for index, container in enumerate(containers):
+        limit = containers[index + 1].start() if index + 1 < len(containers) else len(content)
+        value = _STRONG_RE.search(
+            content, container.end(), _container_end(content, container.end(), limit))
+        if not value:
+            continue
+        try:
+            rate = parse_bcv_number(value.group(1))
+        except ValueError:
+            continue
+        if rate > 0:
+            rates[BCV_CURRENCY_CONTAINERS[container.group(1)]] = rate
+    match = _VALUE_DATE_RE.search(content)
+    value_date = date(*map(int, match.groups())) if match else None
+    return value_date, rates
+
+
+BcvFetchResult = namedtuple(
+    'BcvFetchResult', ['status_code', 'content', 'etag', 'last_modified', 'attempts'])
+BcvFetchResult.__doc__ = """Outcome of BcvClient.fetch; ``attempts`` holds (status or error, seconds) per try."""
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    """Process-wide session, so the connection to the BCV is kept alive between fetches."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(BCV_HEADERS)
+            _session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            _session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        return _session
+
+
+class BcvClient:
+    """
+    HTTP client for the BCV page with conditional requests and bounded retries.
+
+    Sends ``If-None-Match`` / ``If-Modified-Since`` when the validators of the
+    previous response are known, so an unchanged page answers 304 and is never
+    parsed. Timeouts, connection errors and 5xx answers are retried with
+    exponential backoff capped at ``max_backoff`` seconds.
+    """
+
+    def __init__(self, url=BCV_URL, timeout=20, max_attempts=3, backoff=1.0,
+                 max_backoff=8.0, verify=False, sleep=time.sleep):
+        self.url = url
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.verify = verify
+        self.sleep = sleep
+
+    def fetch(self, etag=None, last_modified=None):
+        """
+        Fetch the page, retrying transient failures.
+
+        Args:
+            etag (str, optional): ETag of the last processed response.
+            last_modified (str, optional): Last-Modified of the last processed response.
+
+        Returns:
+            BcvFetchResult: ``status_code`` is 304 when the page did not change.
+
+        Raises:
+            requests.RequestException: When every attempt failed with a network error.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        attempts = []
+        for attempt in range(1, self.max_attempts + 1):
+            started = time.monotonic()
+            try:
+                response = _get_session().get(
+                    self.url, headers=headers, timeout=self.timeout, verify=self.verify)
+            except requests.RequestException as e:
+                outcome, response = type(e).__name__, None
+                if attempt == self.max_attempts:
+                    self._log_attempt(attempt, outcome, started, attempts)
+                    raise
+            else:
+                outcome = response.status_code
+            self._log_attempt(attempt, outcome, started, attempts)
+            if response is not None and (response.status_code < 500 or attempt == self.max_attempts):
+                return BcvFetchResult(
+                    response.status_code,
+                    response.content if response.status_code == 200 else b'',
+                    response.headers.get('ETag'),
+                    response.headers.get('Last-Modified'),
+                    attempts,
+                )
+            self.sleep(min(self.backoff * 2 ** (attempt - 1), self.max_backoff))
+
+    def _log_attempt(self, attempt, outcome, started, attempts):
+        elapsed = time.monotonic() - started
+        attempts.append((outcome, elapsed))
+        _logger.info(
+            f"BCV Fetch: attempt {attempt}/{self.max_attempts} -> {outcome} in {elapsed:.3f}s")
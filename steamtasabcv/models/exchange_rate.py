@@ -1,10 +1,14 @@
 import logging
+from array import array
+from bisect import bisect_right
 
-import requests
 import urllib3
-from bs4 import BeautifulSoup
 from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
+from odoo.tools import SQL, ormcache
+
+from .bcv_archive import iter_bcv_archive_rows
+from .bcv_scraper import BCV_CURRENCY_CONTAINERS, BcvClient, extract_bcv_rates
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -60,6 +64,107 @@ class ExchangeRate(models.Model):
          'Only one exchange rate per currency per day is allowed!')
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self._on_rates_changed()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        self._on_rates_changed()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self._on_rates_changed()
+        return res
+
+    @api.model
+    def _on_rates_changed(self):
+        """Hook called whenever BCV rates are added, modified or removed.
+
+        Clears the rate cache; modules holding values derived from the rate
+        extend it to refresh them.
+        """
+        self.env.registry.clear_cache()
+
+    @api.model
+    def get_current_rate(self, currency, company, date=None):
+        """
+        Return the BCV rate in effect for a currency and company.
+
+        Args:
+            currency (res.currency): Currency of the rate (e.g. VES).
+            company (res.company): Company owning the rate.
+            date (date, optional): Latest rate on or before this date.
+                Defaults to today: rates are stored under their BCV value
+                date, so the newest one may only take effect on a later day.
+
+        Returns:
+            float: The rate, or 0.0 when no active rate exists on that date.
+        """
+        ordinals, rates = self._get_rate_series(currency.id, company.id)
+        index = bisect_right(ordinals, self._rate_ordinal(date)) - 1
+        return rates[index] if index >= 0 else 0.0
+
+    @api.model
+    def convert_many(self, currency, company, amounts_dates):
+        """
+        Convert many amounts, each at the rate in effect on its own date.
+
+        The rate series is loaded once and every pair is resolved by binary
+        search, so converting a whole report column costs no extra queries.
+
+        Args:
+            currency (res.currency): Target currency of the rates (e.g. VES).
+            company (res.company): Company owning the rates.
+            amounts_dates (iterable): ``(amount, date)`` pairs; a ``None``
+                date means today, as in ``get_current_rate``.
+
+        Returns:
+            list: converted amounts, 0.0 where no rate existed yet on that date.
+        """
+        ordinals, rates = self._get_rate_series(currency.id, company.id)
+        today = self._rate_ordinal(None)
+        converted = []
+        for amount, date in amounts_dates:
+            index = bisect_right(ordinals, self._rate_ordinal(date) if date else today) - 1
+            converted.append(amount * rates[index] if index >= 0 else 0.0)
+        return converted
+
+    @api.model
+    def _rate_ordinal(self, date):
+        return fields.Date.to_date(date or fields.Date.context_today(self)).toordinal()
+
+    @api.model
+    @ormcache('currency_id', 'company_id')
+    def _get_rate_series(self, currency_id, company_id):
+        """
+        Active rates of a currency as two parallel arrays sorted by date.
+
+        Returns:
+            tuple: (array of date ordinals, array of rates); when several
+            rates share a day the last created one wins.
+        """
+        self.flush_model(['name', 'rate', 'currency_id', 'company_id', 'active'])
+        self.env.cr.execute(SQL(
+            """
+            SELECT name, rate FROM steamtasabcv_exchange_rate
+             WHERE currency_id = %s AND company_id = %s AND active
+          ORDER BY name, id
+            """,
+            currency_id, company_id,
+        ))
+        ordinals, rates = array('l'), array('d')
+        for name, rate in self.env.cr.fetchall():
+            if ordinals and ordinals[-1] == name.toordinal():
+                rates[-1] = rate
+            else:
+                ordinals.append(name.toordinal())
+                rates.append(rate)
+        return ordinals, rates
+
     @api.depends('rate')
     def _compute_inverse_rate(self):
         for record in self:
@@ -77,122 +182,238 @@ class ExchangeRate(models.Model):
 
     def action_update_currency_rate(self):
         """
-        Push this BCV rate to the standard Odoo res.currency.rate table.
+        Push the selected BCV rates to the standard Odoo res.currency.rate table.
         """
-        self.ensure_one()
-        if not self.currency_id:
+        if not self:
+            raise ValidationError(_("Please select at least one exchange rate."))
+        if not all(self.mapped('currency_id')):
             raise ValidationError(_("Please select a currency first."))
-        RateModel = self.env['res.currency.rate']
-        existing_rate = RateModel.search([
-            ('currency_id', '=', self.currency_id.id),
-            ('name', '=', self.name),
-            ('company_id', '=', self.company_id.id)
-        ], limit=1)
-
-        if existing_rate:
-            existing_rate.rate = self.rate
-            message = _('Currency rate updated successfully.')
-        else:
-            RateModel.create({
-                'currency_id': self.currency_id.id,
-                'name': self.name,
-                'rate': self.rate,
-                'company_id': self.company_id.id
-            })
-            message = _('Currency rate created successfully.')
-
+        count = self._push_to_currency_rates()
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
                 'title': _('Success'),
-                'message': message,
+                'message': _('%s currency rates created or updated.', count),
                 'type': 'success',
                 'sticky': False,
             }
         }
 
     @api.model
-    def cron_fetch_bcv_rate(self):
-        """
-        Cron job to fetch the exchange rate from bcv.org.ve and update Odoo.
+    def _get_bcv_companies(self):
+        """Companies whose currency is VES or one of the currencies published by the BCV."""
+        return self.env['res.company'].sudo().search([
+            ('currency_id.name', 'in', ['VES'] + list(BCV_CURRENCY_CONTAINERS.values())),
+        ])
+
+    @api.model
+    def _prepare_bcv_rate_rows(self, rates_by_date, companies):
         """
-        bcv_url = "https://www.bcv.org.ve/"
-        rate_value = 0.0
+        Turn BCV prices (bolivares per unit) into rate rows for each company.
 
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(
-                bcv_url, headers=headers, timeout=20, verify=False)
-
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                dolar_div = soup.find('div', id='dolar')
-
-                if dolar_div:
-                    strong_tag = dolar_div.find('strong')
-                    if strong_tag:
-                        # Clean data: "36,50" -> "36.50"
-                        raw_text = strong_tag.get_text(strip=True)
-                        clean_text = raw_text.replace(
-                            ',', '.').replace(' ', '')
-                        try:
-                            rate_value = float(clean_text)
-                            _logger.info(
-                                f"BCV Scraper: Rate found: {rate_value}")
-                        except ValueError:
-                            _logger.error(
-                                f"BCV Scraper: Could not convert '{clean_text}' to float.")
+        Args:
+            rates_by_date (dict): ``{date: {currency code: bolivares per unit}}``
+            companies (res.company): Companies to produce rows for.
+
+        Rates follow the res.currency.rate convention: units of the currency
+        per one unit of the company currency. For a USD company the VES row
+        is the dollar price and the EUR row is ``usd_price / eur_price``.
+        Companies whose currency is neither VES nor published by the BCV are
+        skipped.
+
+        Returns:
+            list: dicts with ``name``, ``currency_id``, ``company_id`` and ``rate``
+        """
+        codes = {code for bs_rates in rates_by_date.values() for code in bs_rates}
+        currencies = self.env['res.currency'].search(
+            [('name', 'in', ['VES'] + list(codes))])
+        rows = []
+        for rate_date, bs_rates in rates_by_date.items():
+            for company in companies:
+                company_currency = company.currency_id.name
+                base = 1.0 if company_currency == 'VES' else bs_rates.get(company_currency)
+                if not base:
+                    _logger.warning(
+                        f"BCV Scraper: No BCV price for {company_currency} on {rate_date}, skipping company {company.name}")
+                    continue
+                for currency in currencies:
+                    if currency == company.currency_id:
+                        continue
+                    if currency.name == 'VES':
+                        rate = base
+                    elif bs_rates.get(currency.name):
+                        rate = base / bs_rates[currency.name]
                     else:
-                        _logger.error(
-                            "BCV Scraper: <strong> tag not found inside #dolar.")
-                else:
-                    _logger.error("BCV Scraper: Div #dolar not found.")
-            else:
-                _logger.error(
-                    f"BCV Scraper: HTTP Error {response.status_code}")
+                        continue
+                    rows.append({
+                        'name': rate_date,
+                        'currency_id': currency.id,
+                        'company_id': company.id,
+                        'rate': rate,
+                    })
+        return rows
+
+    @api.model
+    def _upsert_rates(self, rows, overwrite=True):
+        """
+        Insert rate rows in one statement, honouring ``unique_currency_per_day``.
+
+        Args:
+            rows (list): dicts with ``name``, ``currency_id``, ``company_id`` and ``rate``.
+            overwrite (bool): Update the rate of existing rows instead of keeping them.
+
+        Returns:
+            steamtasabcv.exchange.rate: the inserted or updated records
+        """
+        if not rows:
+            return self.browse()
+        self.flush_model()
+        now = fields.Datetime.now()
+        values = SQL(", ").join(
+            SQL("(%s, %s, %s, %s, %s, TRUE, %s, %s, %s, %s)",
+                row['name'], row['currency_id'], row['company_id'], row['rate'],
+                1.0 / row['rate'] if row['rate'] else 0.0,
+                self.env.uid, now, self.env.uid, now)
+            for row in rows
+        )
+        on_conflict = SQL(
+            "DO UPDATE SET rate = EXCLUDED.rate, inverse_rate = EXCLUDED.inverse_rate, "
+            "active = TRUE, write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date"
+        ) if overwrite else SQL("DO NOTHING")
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO steamtasabcv_exchange_rate
+                   (name, currency_id, company_id, rate, inverse_rate, active,
+                    create_uid, create_date, write_uid, write_date)
+            VALUES %s
+            ON CONFLICT (name, currency_id, company_id) %s
+            RETURNING id
+            """,
+            values, on_conflict,
+        ))
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        self.invalidate_model()
+        self._on_rates_changed()
+        return self.browse(ids)
+
+    def _push_to_currency_rates(self):
+        """
+        Copy these BCV rates to res.currency.rate with one batched upsert.
+
+        The upsert bypasses the ORM, so the access rights of the current user
+        on res.currency.rate are checked explicitly first.
+
+        Returns:
+            int: number of res.currency.rate rows inserted or updated
+        """
+        if not self:
+            return 0
+        CurrencyRate = self.env['res.currency.rate']
+        CurrencyRate.check_access('create')
+        CurrencyRate.check_access('write')
+        self.flush_recordset()
+        CurrencyRate.flush_model()
+        now = fields.Datetime.now()
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO res_currency_rate
+                   (name, currency_id, company_id, rate,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT DISTINCT ON (r.name, r.currency_id, r.company_id)
+                   r.name, r.currency_id, r.company_id, r.rate, %s, %s, %s, %s
+              FROM steamtasabcv_exchange_rate r
+             WHERE r.id IN %s
+          ORDER BY r.name, r.currency_id, r.company_id, r.id DESC
+            ON CONFLICT (name, currency_id, company_id)
+            DO UPDATE SET rate = EXCLUDED.rate,
+                          write_uid = EXCLUDED.write_uid,
+                          write_date = EXCLUDED.write_date
+            """,
+            self.env.uid, now, self.env.uid, now, tuple(self.ids),
+        ))
+        count = self.env.cr.rowcount
+        self.env['res.currency.rate'].invalidate_model()
+        self.env['res.currency'].invalidate_model()
+        return count
+
+    @api.model
+    def import_bcv_archive(self, paths, companies=None, chunk_size=5000, overwrite=False):
+        """
+        Backfill BCV rates from archived rate files stored on the server.
 
+        Rows are streamed from each file (see ``bcv_archive.iter_bcv_archive_rows``),
+        converted for every company and written with insert-on-conflict in
+        chunks of ``chunk_size`` rows, then pushed to res.currency.rate in bulk.
+
+        Args:
+            paths (list): Paths of .xls, .xlsx or .csv files.
+            companies (res.company, optional): Defaults to the current company.
+            overwrite (bool): Replace rates that already exist for a day.
+
+        Returns:
+            steamtasabcv.exchange.rate: the inserted or updated records
+        """
+        companies = companies or self.env.company
+        rates_by_date = {}
+        for path in paths:
+            for rate_date, code, rate in iter_bcv_archive_rows(path):
+                rates_by_date.setdefault(rate_date, {})[code] = rate
+        _logger.info(
+            f"BCV Backfill: {len(rates_by_date)} days read from {len(paths)} file(s)")
+        rows = self._prepare_bcv_rate_rows(rates_by_date, companies)
+        records = self.browse()
+        for start in range(0, len(rows), chunk_size):
+            records |= self._upsert_rates(rows[start:start + chunk_size], overwrite=overwrite)
+        records._push_to_currency_rates()
+        _logger.info(f"BCV Backfill: {len(records)} rates stored")
+        return records
+
+    @api.model
+    def cron_fetch_bcv_rate(self):
+        """
+        Cron job to fetch the exchange rates from bcv.org.ve and update Odoo.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        try:
+            response = BcvClient().fetch(
+                etag=ICP.get_param('steamtasabcv.bcv_etag'),
+                last_modified=ICP.get_param('steamtasabcv.bcv_last_modified'))
         except Exception as e:
             _logger.error(f"BCV Scraper: Exception: {e}")
             return
-        if rate_value > 0:
-            ves_currency = self.env['res.currency'].search(
-                [('name', '=', 'VES')], limit=1)
-
-            if not ves_currency:
-                _logger.error(
-                    "BCV Scraper: Currency 'VES' not found in Odoo configuration!")
-                return
-
-            today = fields.Date.today()
-            existing_custom_rate = self.search([
-                ('name', '=', today),
-                ('currency_id', '=', ves_currency.id),
-                ('company_id', '=', self.env.company.id)
-            ], limit=1)
-
-            vals = {
-                'name': today,
-                'currency_id': ves_currency.id,
-                'rate': rate_value,
-                'company_id': self.env.company.id
-            }
+        if response.status_code == 304:
+            _logger.info("BCV Scraper: Page not modified since last fetch, skipping.")
+            return
+        if response.status_code != 200:
+            _logger.error(
+                f"BCV Scraper: HTTP Error {response.status_code}")
+            return
+
+        value_date, bs_rates = extract_bcv_rates(response.content)
+        if 'USD' not in bs_rates:
+            _logger.error("BCV Scraper: Rate container #dolar not found.")
+            return
+        _logger.info(
+            f"BCV Scraper: Rates found for {value_date}: {bs_rates}")
+        if not self.env['res.currency'].search([('name', '=', 'VES')], limit=1):
+            _logger.error(
+                "BCV Scraper: Currency 'VES' not found in Odoo configuration!")
+            return
 
-            try:
-                if existing_custom_rate:
-                    existing_custom_rate.write(vals)
-                    record_to_use = existing_custom_rate
-                    _logger.info(
-                        f"BCV Scraper: Updated local record for {today}")
-                else:
-                    record_to_use = self.create(vals)
-                    _logger.info(
-                        f"BCV Scraper: Created local record for {today}")
-                record_to_use.action_update_currency_rate()
-                _logger.info(
-                    "BCV Scraper: Successfully pushed rate to Odoo Currency Table.")
-
-            except Exception as e:
-                _logger.error(f"BCV Scraper: Database write error: {e}")
+        rate_date = value_date or fields.Date.today()
+        try:
+            companies = self._get_bcv_companies()
+            records = self._upsert_rates(self._prepare_bcv_rate_rows(
+                {rate_date: bs_rates}, companies))
+            _logger.info(
+                f"BCV Scraper: Saved {len(records)} local records for {rate_date} "
+                f"across {len(companies)} companies")
+            records._push_to_currency_rates()
+            _logger.info(
+                "BCV Scraper: Successfully pushed rates to Odoo Currency Table.")
+            # Remember the validators only once the page has been stored
+            ICP.set_param('steamtasabcv.bcv_etag', response.etag or '')
+            ICP.set_param('steamtasabcv.bcv_last_modified', response.last_modified or '')
+        except Exception as e:
+            _logger.error(f"BCV Scraper: Database write error: {e}")
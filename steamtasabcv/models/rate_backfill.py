@@ -0,0 +1,44 @@
+from odoo import _, fields, models
+from odoo.exceptions import UserError
+
+
+class RateBackfill(models.TransientModel):
+    _name = 'steamtasabcv.rate.backfill'
+    _description = 'Backfill BCV Rates from Archived Files'
+
+    file_paths = fields.Text(
+        string='File Paths',
+        required=True,
+        help="Paths on the server of BCV .xls, .xlsx or .csv rate files, one per line."
+    )
+    company_ids = fields.Many2many(
+        'res.company',
+        string='Companies',
+        required=True,
+        default=lambda self: self.env.company
+    )
+    overwrite = fields.Boolean(
+        string='Overwrite Existing Rates',
+        help="Replace the rates already stored for a day instead of keeping them."
+    )
+
+    def action_import(self):
+        self.ensure_one()
+        paths = [path.strip() for path in self.file_paths.splitlines() if path.strip()]
+        if not paths:
+            raise UserError(_("Please provide at least one file path."))
+        try:
+            records = self.env['steamtasabcv.exchange.rate'].import_bcv_archive(
+                paths, companies=self.company_ids, overwrite=self.overwrite)
+        except (OSError, ValueError) as e:
+            raise UserError(_("Could not read the rate files: %s", e))
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Success'),
+                'message': _('%s exchange rates imported.', len(records)),
+                'type': 'success',
+                'sticky': False,
+            }
+        }
@@ -0,0 +1,3 @@
+from . import test_bcv_scraper
+from . import test_bcv_client
+from . import test_exchange_rate
\ No newline at end of file
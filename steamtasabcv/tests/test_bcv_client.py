@@ -0,0 +1,118 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase
+
+from ..models.bcv_scraper import BcvClient
+
+
+class _BcvStandInHandler(BaseHTTPRequestHandler):
+    """Responde con la siguiente respuesta programada en ``server.responses``."""
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        status, headers, body = self.server.responses.pop(0)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@tagged('at_install', 'bcv')
+class TestBcvClient(BaseCase):
+    """BcvClient contra un servidor HTTP local que imita al BCV."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _BcvStandInHandler)
+        cls.server.responses = []
+        cls.server.requests = []
+        thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        thread.start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}/'
+
+    def setUp(self):
+        super().setUp()
+        self.server.responses.clear()
+        self.server.requests.clear()
+        self.sleeps = []
+
+    def _client(self, **kwargs):
+        kwargs.setdefault('timeout', 5)
+        return BcvClient(url=self.url, sleep=self.sleeps.append, **kwargs)
+
+    def test_success_returns_content_and_validators(self):
+        self.server.responses.append((200, {
+            'ETag': '"bcv-1"',
+            'Last-Modified': 'Fri, 15 Mar 2024 12:00:00 GMT',
+        }, b'<html>tasas</html>'))
+        result = self._client().fetch()
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.content, b'<html>tasas</html>')
+        self.assertEqual(result.etag, '"bcv-1"')
+        self.assertEqual(result.last_modified, 'Fri, 15 Mar 2024 12:00:00 GMT')
+        self.assertEqual([outcome for outcome, _seconds in result.attempts], [200])
+        self.assertEqual(self.sleeps, [])
+        self.assertNotIn('If-None-Match', self.server.requests[0])
+
+    def test_not_modified_sends_conditional_headers(self):
+        self.server.responses.append((304, {'ETag': '"bcv-1"'}, b''))
+        result = self._client().fetch(
+            etag='"bcv-1"', last_modified='Fri, 15 Mar 2024 12:00:00 GMT')
+        self.assertEqual(result.status_code, 304)
+        self.assertEqual(result.content, b'')
+        sent = self.server.requests[0]
+        self.assertEqual(sent['If-None-Match'], '"bcv-1"')
+        self.assertEqual(sent['If-Modified-Since'], 'Fri, 15 Mar 2024 12:00:00 GMT')
+        self.assertEqual(len(result.attempts), 1)
+
+    def test_retries_server_errors_with_backoff(self):
+        self.server.responses.extend([
+            (503, {}, b'busy'),
+            (502, {}, b'bad gateway'),
+            (200, {}, b'<html>tasas</html>'),
+        ])
+        result = self._client(max_attempts=3, backoff=0.5).fetch()
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.content, b'<html>tasas</html>')
+        self.assertEqual([outcome for outcome, _seconds in result.attempts], [503, 502, 200])
+        self.assertTrue(all(seconds >= 0 for _outcome, seconds in result.attempts))
+        self.assertEqual(self.sleeps, [0.5, 1.0])
+
+    def test_backoff_is_capped_and_last_error_returned(self):
+        self.server.responses.extend([(500, {}, b'error')] * 5)
+        result = self._client(max_attempts=5, backoff=1.0, max_backoff=3.0).fetch()
+        self.assertEqual(result.status_code, 500)
+        self.assertEqual(result.content, b'')
+        self.assertEqual(len(result.attempts), 5)
+        self.assertEqual(self.sleeps, [1.0, 2.0, 3.0, 3.0])
+
+    def test_client_errors_are_not_retried(self):
+        self.server.responses.append((404, {}, b'not found'))
+        result = self._client(max_attempts=3).fetch()
+        self.assertEqual(result.status_code, 404)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.sleeps, [])
+
+    def test_connection_errors_raise_after_last_attempt(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            closed_port = probe.getsockname()[1]
+        client = BcvClient(
+            url=f'http://127.0.0.1:{closed_port}/', timeout=2, max_attempts=3,
+            backoff=0.25, sleep=self.sleeps.append)
+        with self.assertRaises(requests.ConnectionError):
+            client.fetch()
+        self.assertEqual(self.sleeps, [0.25, 0.5])
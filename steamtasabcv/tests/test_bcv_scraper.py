@@ -0,0 +1,88 @@
+import logging
+import time
+from datetime import date
+
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase
+from odoo.tools import file_open
+
+from ..models.bcv_scraper import extract_bcv_rates, parse_bcv_number
+
+_logger = logging.getLogger(__name__)
+
+FIXTURE = 'steamtasabcv/tests/fixtures/bcv_home.html'
+PARSE_ITERATIONS = 500
+PARSE_BUDGET_MS = 5.0  # tiempo medio máximo por página
+
+
+@tagged('at_install', 'bcv')
+class TestBcvScraper(BaseCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with file_open(FIXTURE, 'rb') as fixture:
+            cls.page = fixture.read()
+
+    def test_parse_bcv_number(self):
+        self.assertEqual(parse_bcv_number('36,50'), 36.5)
+        self.assertEqual(parse_bcv_number(' 1.234,56 '), 1234.56)
+        self.assertEqual(parse_bcv_number('36.4965'), 36.4965)
+        self.assertEqual(parse_bcv_number('0,39798622\xa0'), 0.39798622)
+        with self.assertRaises(ValueError):
+            parse_bcv_number('N/D')
+
+    def test_extract_saved_page(self):
+        value_date, rates = extract_bcv_rates(self.page)
+        self.assertEqual(value_date, date(2024, 3, 15))
+        self.assertEqual(rates, {
+            'USD': 36.4965,
+            'EUR': 41.8036,
+            'CNY': 5.07891234,
+            'TRY': 1.139574,
+            'RUB': 0.39798622,
+        })
+
+    def test_extract_accepts_text(self):
+        self.assertEqual(
+            extract_bcv_rates(self.page.decode('utf-8')), extract_bcv_rates(self.page))
+
+    def test_extract_skips_unpublished_rates(self):
+        page = self.page.replace(b'<strong> 5,07891234 </strong>', b'<strong> N/D </strong>')
+        page = page.replace(b'content="2024-03-15', b'content="fecha')
+        value_date, rates = extract_bcv_rates(page)
+        self.assertIsNone(value_date)
+        self.assertNotIn('CNY', rates)
+        self.assertEqual(len(rates), 4)
+
+    def test_extract_container_without_strong(self):
+        # Un contenedor sin <strong> no toma el valor del siguiente
+        page = self.page.replace(
+            b'<strong> 41,80360000 </strong>', b'<span class="nd"> N/D </span>')
+        _value_date, rates = extract_bcv_rates(page)
+        self.assertNotIn('EUR', rates)
+        self.assertEqual(rates['CNY'], 5.07891234)
+        self.assertEqual(len(rates), 4)
+        self.assertEqual(extract_bcv_rates(
+            '<div id="euro"><span>EUR</span></div><div id="yuan"><strong> 5,07 </strong></div>'),
+            (None, {'CNY': 5.07}))
+
+    def test_extract_last_container_without_strong(self):
+        page = self.page.replace(b'<strong> 36,49650000 </strong>', b'<span> N/D </span>')
+        page = page.replace(b'<span>Fecha Valor:</span>', b'<span>Fecha Valor:</span><strong> 1,00 </strong>')
+        _value_date, rates = extract_bcv_rates(page)
+        self.assertNotIn('USD', rates)
+
+    def test_extract_page_without_rates(self):
+        self.assertEqual(extract_bcv_rates(b'<html><body>Mantenimiento</body></html>'), (None, {}))
+
+    def test_benchmark_parse_time(self):
+        started = time.perf_counter()
+        for _i in range(PARSE_ITERATIONS):
+            extract_bcv_rates(self.page)
+        mean_ms = (time.perf_counter() - started) * 1000 / PARSE_ITERATIONS
+        _logger.info(
+            "extract_bcv_rates: %.3f ms per page (%d bytes, %d iterations)",
+            mean_ms, len(self.page), PARSE_ITERATIONS)
+        self.assertLess(mean_ms, PARSE_BUDGET_MS,
+                        f"Parsing the BCV page took {mean_ms:.3f} ms, budget is {PARSE_BUDGET_MS} ms")
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('at_install', 'bcv')
+class TestExchangeRateLookup(TransactionCase):
+    """Búsqueda binaria de ``get_current_rate`` y ``convert_many`` en sus bordes."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Rate = cls.env['steamtasabcv.exchange.rate']
+        cls.currency = cls.env.ref('base.VES')
+        cls.company = cls.env.company
+        cls.today = fields.Date.context_today(cls.Rate)
+        cls.rates = cls.Rate.create([{
+            'name': cls.today + timedelta(days=offset),
+            'currency_id': cls.currency.id,
+            'company_id': cls.company.id,
+            'rate': rate,
+        } for offset, rate in ((-10, 30.0), (-3, 33.0), (0, 36.0), (1, 37.0))])
+
+    def _rate(self, date=None):
+        return self.Rate.get_current_rate(self.currency, self.company, date)
+
+    def test_before_first_rate(self):
+        self.assertEqual(self._rate(self.today - timedelta(days=11)), 0.0)
+        other = self.env['res.currency'].search([('id', '!=', self.currency.id)], limit=1)
+        self.assertEqual(self.Rate.get_current_rate(other, self.company), 0.0)
+
+    def test_exact_and_between_dates(self):
+        self.assertEqual(self._rate(self.today - timedelta(days=10)), 30.0)
+        self.assertEqual(self._rate(self.today - timedelta(days=4)), 30.0)
+        self.assertEqual(self._rate(self.today - timedelta(days=3)), 33.0)
+        self.assertEqual(self._rate(fields.Date.to_string(self.today - timedelta(days=1))), 33.0)
+        self.assertEqual(self._rate(self.today + timedelta(days=30)), 37.0)
+
+    def test_default_date_is_today(self):
+        # La tasa publicada con Fecha Valor de mañana todavía no está vigente
+        self.assertEqual(self._rate(), 36.0)
+        self.assertEqual(self._rate(self.today), 36.0)
+
+    def test_same_day_overwrite(self):
+        self.assertEqual(self._rate(), 36.0)
+        self.rates[2].rate = 36.5
+        self.assertEqual(self._rate(), 36.5)
+        self.rates[2].active = False
+        self.assertEqual(self._rate(), 33.0)
+
+    def test_convert_many(self):
+        converted = self.Rate.convert_many(self.currency, self.company, [
+            (10.0, self.today - timedelta(days=20)),
+            (10.0, self.today - timedelta(days=10)),
+            (10.0, self.today - timedelta(days=2)),
+            (10.0, None),
+            (10.0, self.today + timedelta(days=1)),
+        ])
+        self.assertEqual(converted, [0.0, 300.0, 330.0, 360.0, 370.0])
+        self.assertEqual(self.Rate.convert_many(self.currency, self.company, []), [])
+
+    def test_convert_many_single_query(self):
+        pairs = [(1.0, self.today - timedelta(days=day % 15)) for day in range(1000)]
+        self.env.registry.clear_cache()
+        with self.assertQueryCount(1):
+            converted = self.Rate.convert_many(self.currency, self.company, pairs)
+        self.assertEqual(len(converted), 1000)